@@ -1,38 +1,82 @@
 import os
-import subprocess
+import sys
+import logging
 import json
 import base64
-import tempfile
-from dotenv import load_dotenv
-from openai import AzureOpenAI
+import contextlib
 import asyncio
-from PIL import Image
-import io
 import ffmpeg_utils
+import openai_utils
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Azure OpenAI configuration
-AZURE_ENDPOINT = "https://ai-coe-openai-models-latest.openai.azure.com/"
-AZURE_MODEL = "gpt-4o-mini"
-AZURE_DEPLOYMENT = "gpt-4o-mini"
-AZURE_API_VERSION = "2024-12-01-preview"
+# Maximum number of videos talking to the API at the same time (keeps us under the Azure rate limits)
+MAX_CONCURRENCY = int(os.getenv("AI_EDITOR_CONCURRENCY", "16"))
 
-# Get API key from environment variable or set it directly
-# IMPORTANT: For security, it's better to use environment variables than hardcoding the key
-AZURE_API_KEY = os.getenv("AZURE_OPENAI_API_KEY", "")
+# Maximum number of videos probed/decoded by ffmpeg at the same time (CPU bound)
+EXTRACT_CONCURRENCY = int(os.getenv("AI_EDITOR_EXTRACT_CONCURRENCY", str(os.cpu_count() or 4)))
 
-# Create OpenAI client using Azure OpenAI with API key authentication
-try:
-    openai_client = AzureOpenAI(
-        api_version=AZURE_API_VERSION,
-        azure_endpoint=AZURE_ENDPOINT,
-        api_key=AZURE_API_KEY,
-    )
-    print("Initialized Azure OpenAI client with API key authentication")
-except Exception as e:
-    print(f"Error initializing Azure OpenAI client: {e}")
+# Maximum number of videos whose extracted frames are waiting for or being described, so
+# extraction cannot run ahead of the API and hold the frames of the whole folder in memory
+FRAMES_IN_FLIGHT = int(os.getenv("AI_EDITOR_FRAMES_IN_FLIGHT", "32"))
+
+# JPEG quality scale for extracted frames (2 = best, 31 = worst); ~5 is plenty for the vision model
+FRAME_JPEG_QSCALE = os.getenv("AI_EDITOR_FRAME_QSCALE", "5")
+
+# Longest side (in pixels) of frames sent to the vision model
+FRAME_MAX_DIM = int(os.getenv("AI_EDITOR_FRAME_MAX_DIM", "768"))
+
+# ffmpeg scale filter that shrinks frames to FRAME_MAX_DIM on the long side, keeping aspect ratio
+FRAME_SCALE_FILTER = (
+    f"scale='if(gte(iw,ih),min({FRAME_MAX_DIM},iw),-2)':'if(gte(iw,ih),-2,min({FRAME_MAX_DIM},ih))'"
+)
+
+# Prefix of the data URL used to send JPEG frames to the vision model
+DATA_URL_PREFIX = "data:image/jpeg;base64,"
+
+# Instructions for describing a frame. Kept identical across calls and at the front of the
+# request so Azure OpenAI's automatic prompt caching can reuse the prefix.
+DESCRIBE_IMAGE_PROMPT = (
+    "You are an image analyzer for video editing. Describe the image in less than 2 sentences, "
+    "straight to the point: what is in focus, the camera shot and angle, and what the subject(s) are doing."
+)
+
+# Instructions for inferring what happens in a video from its first and last frame descriptions
+ANALYZE_VIDEO_PROMPT = (
+    "You are a video content analyzer. Based on descriptions of the first and last frames of a video, "
+    "infer what likely happens during the footage. Keep your answer really short."
+)
+
+# Instructions for turning the video analyses into a shot list
+SHOT_LIST_PROMPT = """You are a professional video editor.
+Your task is to create a shot list in JSON format that tells a coherent story using the available footage.
+Analyze the content of each video and suggest an order, timestamps, and transitions that would create a compelling narrative.
+The output should be valid JSON with the following structure:
+{
+  "project_name": "A descriptive name based on the content",
+  "narrative_theme": "A brief description of the story or theme",
+  "shots": [
+    {
+      "filename": "original_filename.mp4",
+      "description": "Brief description of this shot's purpose in the narrative",
+      "start_time": "HH:MM:SS",
+      "end_time": "HH:MM:SS",
+      "duration": "HH:MM:SS",
+      "transition_in": "fade in/dissolve/cut/etc",
+      "transition_out": "fade out/dissolve/cut/etc"
+    }
+  ],
+  "audio_suggestions": {
+    "background_music": "Style of music that would fit",
+    "sound_effects": ["List", "of", "suggested", "sound effects"]
+  }
+}
+Use realistic timestamps based on the actual duration of each video.
+Be creative but practical in your suggestions."""
+
+# In-memory caches of API results, so identical frames and frame pairs are only sent once per run
+_description_cache = {}
+_analysis_cache = {}
 
 async def test_api_connection():
     """
@@ -43,17 +87,18 @@ async def test_api_connection():
                and message contains details about the connection status
     """
     print("Testing connection to Azure OpenAI API...")
-    print(f"Endpoint: {AZURE_ENDPOINT}")
-    print(f"Model: {AZURE_MODEL}")
-    print(f"Deployment: {AZURE_DEPLOYMENT}")
+    print(f"Endpoint: {openai_utils.AZURE_ENDPOINT}")
+    print(f"Model: {openai_utils.AZURE_MODEL}")
+    print(f"Deployment: {openai_utils.AZURE_DEPLOYMENT}")
     
     # Check if API key is set
-    if not AZURE_API_KEY:
+    if not os.getenv("AZURE_OPENAI_API_KEY"):
         return False, "API key is not set. Please set the AZURE_OPENAI_API_KEY environment variable."
     
     try:
         # Simple API call to test connection
-        response = openai_client.chat.completions.create(
+        response = await openai_utils.call_with_retry(
+            openai_utils.get_openai_client().chat.completions.create,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": "I am going to Paris, what should I see?"}
@@ -61,7 +106,7 @@ async def test_api_connection():
             max_tokens=4096,
             temperature=1.0,
             top_p=1.0,
-            model=AZURE_DEPLOYMENT
+            model=openai_utils.AZURE_DEPLOYMENT
         )
         
         # Print the response for verification
@@ -84,79 +129,151 @@ async def test_api_connection():
         else:
             return False, f"Connection error: {error_message}"
 
-async def extract_frame(video_path, time_position, output_path=None):
+async def extract_frame(video_path, time_position):
     """
     Extract a frame from a video at a specific time position.
     
     Args:
         video_path: Path to the video file
         time_position: Time position in format "HH:MM:SS.mmm" or seconds
-        output_path: Path to save the extracted frame (optional)
         
     Returns:
-        Path to the extracted frame image
+        JPEG bytes of the extracted frame
     """
-    if output_path is None:
-        # Create a temporary file if no output path is provided
-        fd, output_path = tempfile.mkstemp(suffix='.jpg')
-        os.close(fd)
+    # Numeric positions are formatted with millisecond precision; "HH:MM:SS.mmm" strings are passed through
+    if isinstance(time_position, (int, float)):
+        time_position = f"{time_position:.3f}"
+    
+    # Seek on the input (-ss before -i) so ffmpeg jumps to the nearest keyframe instead of decoding from the start
+    command = [
+        ffmpeg_utils.FFMPEG_BIN, "-y",
+        "-ss", time_position, "-i", video_path,
+        "-frames:v", "1",
+        "-vf", FRAME_SCALE_FILTER,
+        "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", FRAME_JPEG_QSCALE, "pipe:1"
+    ]
+    
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
     
-    try:
-        command = [
-            "ffmpeg", "-y", "-i", video_path,
-            "-ss", str(time_position),
-            "-frames:v", "1",
-            output_path
-        ]
-        
-        subprocess.run(command, check=True, capture_output=True)
-        return output_path
-    except subprocess.CalledProcessError as e:
-        print(f"Error extracting frame: {e}")
-        print(f"Error output: {e.stderr.decode() if e.stderr else 'None'}")
+    if process.returncode != 0 or not stdout:
+        print(f"Error extracting frame: ffmpeg exited with status {process.returncode}")
+        print(f"Error output: {stderr.decode() if stderr else 'None'}")
         return None
+    
+    return stdout
+
+def split_jpeg_stream(data):
+    """
+    Split a stream of concatenated JPEG images (as written by ffmpeg's image2pipe) into single images.
+    
+    Args:
+        data: Bytes containing one or more JPEG images
+        
+    Returns:
+        List of JPEG bytes, one per image
+    """
+    # Every image ends with an EOI marker (FFD9) immediately followed by the next SOI marker (FFD8)
+    parts = data.split(b"\xff\xd9\xff\xd8")
+    if len(parts) == 1:
+        return [data] if data else []
+    
+    return [parts[0] + b"\xff\xd9"] + [b"\xff\xd8" + part + b"\xff\xd9" for part in parts[1:-1]] + [b"\xff\xd8" + parts[-1]]
+
+async def extract_first_and_last_frames(video_path):
+    """
+    Extract the first and last frames of a video with a single ffmpeg invocation.
+    
+    Args:
+        video_path: Path to the video file
+        
+    Returns:
+        Tuple of (first_frame, last_frame) JPEG bytes, with None for a frame that could not be extracted
+    """
+    # Open the video twice with input-side seeking so ffmpeg jumps straight to
+    # both positions instead of decoding the whole file, then pipe both frames
+    # to stdout as one MJPEG stream. The last frame is taken 1 second before
+    # the end (-sseof) to avoid black frames, so the duration is not needed.
+    command = [
+        ffmpeg_utils.FFMPEG_BIN, "-y",
+        "-ss", "0", "-i", video_path,
+        "-sseof", "-1", "-i", video_path,
+        "-filter_complex", (
+            "[0:v:0]trim=end_frame=1[first];[1:v:0]trim=end_frame=1[last];"
+            f"[first][last]concat=n=2:v=1:a=0,{FRAME_SCALE_FILTER}[out]"
+        ),
+        "-map", "[out]",
+        "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", FRAME_JPEG_QSCALE, "pipe:1"
+    ]
+    
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    
+    if process.returncode != 0:
+        print(f"Error extracting frames from {video_path}")
+        print(f"Error output: {stderr.decode() if stderr else 'None'}")
+    
+    frames = split_jpeg_stream(stdout)
+    first_frame = frames[0] if len(frames) > 0 else None
+    last_frame = frames[1] if len(frames) > 1 else None
+    return first_frame, last_frame
 
-async def encode_image_to_base64(image_path):
+async def encode_image_to_base64(image_bytes):
     """
-    Encode an image file to base64 string.
+    Encode image bytes to base64 string.
     
     Args:
-        image_path: Path to the image file
+        image_bytes: Bytes of the image
         
     Returns:
         Base64 encoded string of the image
     """
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    return base64.b64encode(image_bytes).decode('ascii')
 
-async def describe_image(image_path):
+async def describe_image(image_bytes):
     """
     Use Azure OpenAI to describe an image.
     
     Args:
-        image_path: Path to the image file
+        image_bytes: JPEG bytes of the image
         
     Returns:
         Description of the image
     """
+    # Return the cached description if this exact frame was already described
+    cache_key = openai_utils.cache_key(DESCRIBE_IMAGE_PROMPT, image_bytes)
+    cached = openai_utils.read_cache("describe", cache_key, _description_cache)
+    if cached is not None:
+        return cached
+    
     try:
         # Encode image to base64
-        base64_image = await encode_image_to_base64(image_path)
+        base64_image = await encode_image_to_base64(image_bytes)
         
         # Call Azure OpenAI API
-        response = openai_client.chat.completions.create(
-            model=AZURE_DEPLOYMENT,
+        response = await openai_utils.call_with_retry(
+            openai_utils.get_openai_client().chat.completions.create,
+            model=openai_utils.AZURE_DEPLOYMENT,
             messages=[
-                {"role": "system", "content": "You are a detailed image analyzer. Describe what you see in the image with specific details about the scene, camera shot type, objects, lighting, and atmosphere."},
+                {"role": "system", "content": DESCRIBE_IMAGE_PROMPT},
                 {"role": "user", "content": [
-                    {"type": "text", "text": "Describe this image in a brief, straight to the point way. What is in focus on the image, what is the camera shot and angle, what action the subject(s) doing. keep it to less than 2 sentence."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    {"type": "image_url", "image_url": {"url": "".join((DATA_URL_PREFIX, base64_image))}}
                 ]}
             ],
-            max_tokens=500
+            max_tokens=120
         )
         
-        return response.choices[0].message.content
+        description = response.choices[0].message.content
+        openai_utils.write_cache("describe", cache_key, description, _description_cache)
+        return description
     except Exception as e:
         print(f"Error describing image: {e}")
         return "Error: Could not generate description."
@@ -173,51 +290,110 @@ async def analyze_video_content(first_frame_description, last_frame_description,
     Returns:
         Analysis of what likely happens in the video
     """
-    try:
-        metadata_text = ""
-        if video_metadata:
-            metadata_text = f"Video duration: {video_metadata.get('duration_formatted', 'unknown')}\n"
-            metadata_text += f"Resolution: {video_metadata.get('resolution', 'unknown')}\n"
+    metadata_text = ""
+    if video_metadata:
+        metadata_text = f"Video duration: {video_metadata.get('duration_formatted', 'unknown')}\n"
+        metadata_text += f"Resolution: {video_metadata.get('resolution', 'unknown')}\n"
+    
+    messages = [
+        {"role": "system", "content": ANALYZE_VIDEO_PROMPT},
+        {"role": "user", "content": f"""
+        {metadata_text}
         
-        response = openai_client.chat.completions.create(
-            model=AZURE_DEPLOYMENT,
-            messages=[
-                {"role": "system", "content": "You are a video content analyzer. Based on descriptions of the first and last frames of a video, infer what likely happens during the footage. Keep your answer really short."},
-                {"role": "user", "content": f"""
-                {metadata_text}
-                
-                First frame description:
-                {first_frame_description}
-                
-                Last frame description:
-                {last_frame_description}
-                
-                Based on these descriptions, explain very briefly what likely happens in this video footage? Focus on the actions by the characters and the camera movements, and if something changes or new element appears in the video. Keep your answer straight to the point.
-                """}
-            ],
+        First frame description:
+        {first_frame_description}
+        
+        Last frame description:
+        {last_frame_description}
+        
+        Based on these descriptions, explain very briefly what likely happens in this video footage? Focus on the actions by the characters and the camera movements, and if something changes or new element appears in the video. Keep your answer straight to the point.
+        """}
+    ]
+    
+    # Return the cached analysis if this exact prompt was already answered
+    cache_key = openai_utils.cache_key(json.dumps(messages))
+    cached = openai_utils.read_cache("analyze", cache_key, _analysis_cache)
+    if cached is not None:
+        return cached
+    
+    try:
+        response = await openai_utils.call_with_retry(
+            openai_utils.get_openai_client().chat.completions.create,
+            model=openai_utils.AZURE_DEPLOYMENT,
+            messages=messages,
             max_tokens=800
         )
         
-        return response.choices[0].message.content
+        analysis = response.choices[0].message.content
+        openai_utils.write_cache("analyze", cache_key, analysis, _analysis_cache)
+        return analysis
     except Exception as e:
         print(f"Error analyzing video content: {e}")
         return "Error: Could not generate analysis."
 
-async def analyze_video(video_path):
+def _normalize_description(description):
+    """
+    Lowercase a frame description and collapse its whitespace, for comparing descriptions.
+    """
+    return " ".join(description.lower().split())
+
+async def _describe_first_and_last_frames(video_path, extract_limit=None, api_limit=None):
+    """
+    Extract the metadata and first and last frames of a video, and describe both frames.
+    
+    The frames are only held while this runs, so callers can bound memory by
+    bounding how many of these run at the same time.
+    
+    Returns:
+        Tuple of (metadata, first_description, last_description, same_frame); metadata is
+        None (and nothing is described) if it could not be extracted
+    """
+    # Get video metadata and extract first and last frames at the same time
+    async with extract_limit or contextlib.nullcontext():
+        metadata, (first_frame, last_frame) = await asyncio.gather(
+            asyncio.to_thread(ffmpeg_utils.extract_video_metadata_cached, video_path),
+            extract_first_and_last_frames(video_path)
+        )
+    
+    if not metadata:
+        return None, None, None, False
+    
+    # A static shot gives identical first and last frames, which only need to be described once
+    same_frame = first_frame is not None and first_frame == last_frame
+    
+    # Describe first and last frames concurrently
+    print("Describing first and last frames...")
+    async with api_limit or contextlib.nullcontext():
+        first_description, last_description = await asyncio.gather(
+            describe_image(first_frame) if first_frame else asyncio.sleep(0),
+            describe_image(last_frame) if last_frame and not same_frame else asyncio.sleep(0)
+        )
+    if same_frame:
+        last_description = first_description
+    
+    return metadata, first_description, last_description, same_frame
+
+async def analyze_video(video_path, extract_limit=None, api_limit=None, frames_limit=None):
     """
     Analyze a video by extracting and describing its first and last frames,
     then generating a description of what happens in the footage.
     
     Args:
         video_path: Path to the video file
+        extract_limit: Optional semaphore bounding concurrent ffmpeg/ffprobe work
+        api_limit: Optional semaphore bounding concurrent Azure OpenAI work
+        frames_limit: Optional semaphore bounding the videos whose frames are held in memory,
+            from extraction until both frames are described
         
     Returns:
         Dictionary containing the analysis results
     """
     print(f"\nAnalyzing video: {os.path.basename(video_path)}")
     
-    # Get video metadata
-    metadata = ffmpeg_utils.extract_video_metadata(video_path)
+    async with frames_limit or contextlib.nullcontext():
+        metadata, first_description, last_description, same_frame = await _describe_first_and_last_frames(
+            video_path, extract_limit, api_limit
+        )
     
     if not metadata:
         return {
@@ -225,46 +401,35 @@ async def analyze_video(video_path):
             "error": "Could not extract metadata"
         }
     
-    # Extract first frame (at 0 seconds)
-    first_frame_path = await extract_frame(video_path, 0)
-    
-    # Extract last frame (1 second before the end to avoid black frames)
-    duration = metadata.get("duration", 0)
-    last_time = max(0, duration - 1)
-    last_frame_path = await extract_frame(video_path, last_time)
-    
     results = {
         "filename": os.path.basename(video_path),
         "metadata": metadata,
         "first_frame": {
-            "path": first_frame_path,
-            "description": None
+            "description": first_description
         },
         "last_frame": {
-            "path": last_frame_path,
-            "description": None
+            "description": last_description
         },
         "video_description": None
     }
     
-    # Describe first frame
-    print("Describing first frame...")
-    if first_frame_path:
-        results["first_frame"]["description"] = await describe_image(first_frame_path)
-    
-    # Describe last frame
-    print("Describing last frame...")
-    if last_frame_path:
-        results["last_frame"]["description"] = await describe_image(last_frame_path)
-    
     # Analyze video content based on frame descriptions
-    if results["first_frame"]["description"] and results["last_frame"]["description"]:
+    if first_description and last_description:
+        # A static shot looks the same at the start and the end, so there is nothing more to infer.
+        # Only identical frames or descriptions count: similar wording can still hide motion.
+        if not first_description.startswith("Error:") and (
+                same_frame or _normalize_description(first_description) == _normalize_description(last_description)):
+            print("First and last frames match, skipping video content analysis")
+            results["video_description"] = f"Static shot. {first_description}"
+            return results
+        
         print("Analyzing video content...")
-        results["video_description"] = await analyze_video_content(
-            results["first_frame"]["description"],
-            results["last_frame"]["description"],
-            metadata
-        )
+        async with api_limit or contextlib.nullcontext():
+            results["video_description"] = await analyze_video_content(
+                first_description,
+                last_description,
+                metadata
+            )
     
     return results
 
@@ -306,14 +471,14 @@ async def analyze_videos_in_folder(folder_path, output_json=None):
         "videos": []
     }
     
-    # Supported video extensions
-    video_extensions = ('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v')
-    
-    # Find all video files in the folder
-    video_files = []
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith(video_extensions):
-            video_files.append(os.path.join(folder_path, filename))
+    # Find all video files in the folder, skipping hidden files, symlinks and directories
+    with os.scandir(folder_path) as entries:
+        video_files = sorted(
+            entry.path for entry in entries
+            if not entry.name.startswith('.')
+            and os.path.splitext(entry.name)[1].lower() in ffmpeg_utils.VIDEO_EXTENSIONS
+            and entry.is_file(follow_symlinks=False)
+        )
     
     if not video_files:
         print(f"No video files found in {folder_path}")
@@ -323,26 +488,30 @@ async def analyze_videos_in_folder(folder_path, output_json=None):
     all_analyses["total_videos"] = len(video_files)
     print(f"Found {len(video_files)} video files to analyze")
     
-    # Process each video file
-    for i, video_path in enumerate(video_files):
-        print(f"\nProcessing video {i+1}/{len(video_files)}: {os.path.basename(video_path)}")
-        analysis = await analyze_video(video_path)
+    # Process the video files as a pipeline: frame extraction (CPU) and API calls (network)
+    # are bounded separately, so ffmpeg keeps working on the next videos while earlier
+    # ones wait for Azure OpenAI. frames_limit bounds the videos between the two stages,
+    # so extraction stays at most FRAMES_IN_FLIGHT videos ahead of the describe calls.
+    extract_limit = asyncio.Semaphore(EXTRACT_CONCURRENCY)
+    api_limit = asyncio.Semaphore(MAX_CONCURRENCY)
+    frames_limit = asyncio.Semaphore(FRAMES_IN_FLIGHT)
+    
+    analyses = await asyncio.gather(
+        *(analyze_video(video_path, extract_limit, api_limit, frames_limit) for video_path in video_files),
+        return_exceptions=True
+    )
+    
+    for video_path, analysis in zip(video_files, analyses):
+        if isinstance(analysis, Exception):
+            print(f"Error analyzing {os.path.basename(video_path)}: {analysis}")
+            continue
         
         if analysis:
             all_analyses["videos"].append(analysis)
     
     # Save to JSON file if requested
     if output_json:
-        with open(output_json, 'w') as f:
-            # Create a simplified version for JSON output (without image paths)
-            json_output = all_analyses.copy()
-            for video in json_output["videos"]:
-                if "first_frame" in video and "path" in video["first_frame"]:
-                    video["first_frame"].pop("path", None)
-                if "last_frame" in video and "path" in video["last_frame"]:
-                    video["last_frame"].pop("path", None)
-            
-            json.dump(json_output, f, indent=2)
+        openai_utils.save_json(all_analyses, output_json)
         print(f"Analysis saved to {output_json}")
     
     return all_analyses
@@ -386,34 +555,11 @@ async def generate_shot_list_from_analysis(analysis_data, output_json=None):
     
     try:
         # Call Azure OpenAI API to generate shot list
-        response = openai_client.chat.completions.create(
-            model=AZURE_DEPLOYMENT,
+        response = await openai_utils.call_with_retry(
+            openai_utils.get_openai_client().chat.completions.create,
+            model=openai_utils.AZURE_DEPLOYMENT,
             messages=[
-                {"role": "system", "content": """You are a professional video editor. 
-                Your task is to create a shot list in JSON format that tells a coherent story using the available footage.
-                Analyze the content of each video and suggest an order, timestamps, and transitions that would create a compelling narrative.
-                The output should be valid JSON with the following structure:
-                {
-                  "project_name": "A descriptive name based on the content",
-                  "narrative_theme": "A brief description of the story or theme",
-                  "shots": [
-                    {
-                      "filename": "original_filename.mp4",
-                      "description": "Brief description of this shot's purpose in the narrative",
-                      "start_time": "HH:MM:SS",
-                      "end_time": "HH:MM:SS",
-                      "duration": "HH:MM:SS",
-                      "transition_in": "fade in/dissolve/cut/etc",
-                      "transition_out": "fade out/dissolve/cut/etc"
-                    }
-                  ],
-                  "audio_suggestions": {
-                    "background_music": "Style of music that would fit",
-                    "sound_effects": ["List", "of", "suggested", "sound effects"]
-                  }
-                }
-                Use realistic timestamps based on the actual duration of each video.
-                Be creative but practical in your suggestions."""},
+                {"role": "system", "content": SHOT_LIST_PROMPT},
                 {"role": "user", "content": f"""Here are the videos available for editing:
                 
                 {videos_text}
@@ -423,25 +569,16 @@ async def generate_shot_list_from_analysis(analysis_data, output_json=None):
                 Return ONLY the JSON with no additional text."""}
             ],
             max_tokens=2000,
-            temperature=0.7
+            temperature=0.7,
+            response_format={"type": "json_object"}
         )
         
-        # Extract and parse the JSON response
-        shot_list_text = response.choices[0].message.content
-        
-        # Clean up the response to ensure it's valid JSON
-        # Remove any markdown code block indicators and extra text
-        if "```json" in shot_list_text:
-            shot_list_text = shot_list_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in shot_list_text:
-            shot_list_text = shot_list_text.split("```")[1].split("```")[0].strip()
-        
-        shot_list = json.loads(shot_list_text)
+        # JSON mode guarantees the response is a plain JSON object
+        shot_list = openai_utils.load_json(response.choices[0].message.content)
         
         # Save to JSON file if requested
         if output_json:
-            with open(output_json, 'w') as f:
-                json.dump(shot_list, f, indent=2)
+            openai_utils.save_json(shot_list, output_json)
             print(f"Shot list saved to {output_json}")
         
         return shot_list
@@ -464,77 +601,83 @@ async def main():
     parser.add_argument('--api-key', help='Azure OpenAI API key (overrides environment variable)')
     parser.add_argument('--generate-shot-list', action='store_true', 
                         help='Generate a shot list narrative based on video analysis')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore cached frame descriptions and analyses and always call the API')
     
     args = parser.parse_args()
     
-    # Override API key if provided
-    if args.api_key:
-        global AZURE_API_KEY
-        global openai_client
-        AZURE_API_KEY = args.api_key
-        openai_client = AzureOpenAI(
-            api_version=AZURE_API_VERSION,
-            azure_endpoint=AZURE_ENDPOINT,
-            api_key=AZURE_API_KEY,
-        )
-        print("Using API key provided via command line")
-    
-    # If test-only flag is set or no arguments provided, just test the API connection
-    if args.test_only or args.folder == 'test':
-        print("Running API connection test...")
-        success, message = await test_api_connection()
-        if success:
-            print(f"\n✅ {message}")
-        else:
-            print(f"\n❌ {message}")
-        return
-    
-    folder_path = args.folder
-    
-    # Check if folder exists
-    if not os.path.isdir(folder_path):
-        print(f"Error: The folder '{folder_path}' does not exist or is not a directory")
-        return
-    
-    # Set default output path to be in the same folder as the videos
-    output_path = args.output
-    if not output_path:
-        folder_name = os.path.basename(os.path.normpath(folder_path))
-        output_path = os.path.join(folder_path, f"{folder_name}_analysis.json")
-        print(f"Output will be saved to: {output_path}")
-    
-    analyses = await analyze_videos_in_folder(folder_path, output_path)
-    
-    # Check if there was an API error
-    if "error" in analyses:
-        print(f"\n❌ Analysis failed: {analyses['error']}")
-        return
-    
-    # Print a summary to console
-    print("\nVideo Analysis Summary:")
-    print(f"Total videos analyzed: {analyses['total_videos']}")
-    
-    # Print table of videos
-    if analyses['videos']:
-        for video in analyses['videos']:
-            print(f"\n--- {video['filename']} ---")
-            print("\nContent Analysis:")
-            print(video.get('video_description', 'No analysis available'))
-            print("\n" + "-" * 80)
-    
-    if analyses['total_videos'] > 0:
-        print(f"\nFull analysis saved to: {output_path}")
+    if args.no_cache:
+        openai_utils.use_cache = False
+    
+    # Reuse metadata probed in earlier runs
+    ffmpeg_utils.load_metadata_cache()
+    
+    try:
+        # Override API key if provided
+        if args.api_key:
+            os.environ["AZURE_OPENAI_API_KEY"] = args.api_key
+            await openai_utils.close_openai_client()
+            print("Using API key provided via command line")
+    
+        # If test-only flag is set or no arguments provided, just test the API connection
+        if args.test_only or args.folder == 'test':
+            print("Running API connection test...")
+            success, message = await test_api_connection()
+            if success:
+                print(f"\n✅ {message}")
+            else:
+                print(f"\n❌ {message}")
+            return
+    
+        folder_path = args.folder
+    
+        # Check if folder exists
+        if not os.path.isdir(folder_path):
+            print(f"Error: The folder '{folder_path}' does not exist or is not a directory")
+            return
+    
+        # Set default output path to be in the same folder as the videos
+        output_path = args.output
+        if not output_path:
+            folder_name = os.path.basename(os.path.normpath(folder_path))
+            output_path = os.path.join(folder_path, f"{folder_name}_analysis.json")
+            print(f"Output will be saved to: {output_path}")
+    
+        analyses = await analyze_videos_in_folder(folder_path, output_path)
+    
+        # Check if there was an API error
+        if "error" in analyses:
+            print(f"\n❌ Analysis failed: {analyses['error']}")
+            return
+    
+        # Print a summary to console
+        print("\nVideo Analysis Summary:")
+        print(f"Total videos analyzed: {analyses['total_videos']}")
+    
+        # Print table of videos
+        if analyses['videos']:
+            for video in analyses['videos']:
+                print(f"\n--- {video['filename']} ---")
+                print("\nContent Analysis:")
+                print(video.get('video_description', 'No analysis available'))
+                print("\n" + "-" * 80)
+    
+        if analyses['total_videos'] > 0:
+            print(f"\nFull analysis saved to: {output_path}")
 
-    if args.generate_shot_list and analyses and "videos" in analyses and analyses["videos"]:
-        # Generate shot list filename based on the output path
-        shot_list_path = os.path.splitext(output_path)[0] + "_shot_list.json"
-        shot_list = await generate_shot_list_from_analysis(analyses, shot_list_path)
-        if shot_list:
-            print(f"\nShot list generated and saved to: {shot_list_path}")
+        if args.generate_shot_list and analyses and "videos" in analyses and analyses["videos"]:
+            # Generate shot list filename based on the output path
+            shot_list_path = os.path.splitext(output_path)[0] + "_shot_list.json"
+            shot_list = await generate_shot_list_from_analysis(analyses, shot_list_path)
+            if shot_list:
+                print(f"\nShot list generated and saved to: {shot_list_path}")
+    finally:
+        ffmpeg_utils.save_metadata_cache()
+        await openai_utils.close_openai_client()
 
 if __name__ == "__main__":
     # If script is run directly, run the test function
-    if len(os.sys.argv) == 1:
+    if len(sys.argv) == 1:
         print("No arguments provided. Running API test...")
         asyncio.run(test_api_connection())
     else:
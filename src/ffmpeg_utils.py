@@ -3,6 +3,80 @@ import json
 import os
 import datetime
 import argparse
+import functools
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson is much faster than the standard json module; fall back to json if it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# FFmpeg binaries, resolved once instead of on every subprocess call
+FFMPEG_BIN = shutil.which("ffmpeg") or "ffmpeg"
+FFPROBE_BIN = shutil.which("ffprobe") or "ffprobe"
+
+if os.getenv("FFMPEG_REQUIRED") == "1" and not (shutil.which("ffmpeg") and shutil.which("ffprobe")):
+    raise RuntimeError("ffmpeg and ffprobe must be installed and on PATH (FFMPEG_REQUIRED=1)")
+
+# Supported video file extensions (lowercase)
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v'})
+
+# Flags added to every FFmpeg command run through run_ffmpeg_command
+QUIET_FFMPEG_FLAGS = ("-hide_banner", "-loglevel", "error", "-nostats")
+
+# "width,height" as printed by ffprobe with -of csv=p=0
+_RESOLUTION_RE = re.compile(rb"(\d+),(\d+)")
+
+# Minimum (width, height) for each common resolution name, largest first
+RESOLUTION_THRESHOLDS = (
+    (7680, 4320, "8K"),
+    (3840, 2160, "4K"),
+    (2560, 1440, "2K"),
+    (1920, 1080, "1080p"),
+    (1280, 720, "720p"),
+    (854, 480, "480p"),
+)
+
+# Extracted metadata keyed by "path|mtime_ns|size", so unchanged files are only probed once
+_metadata_cache = {}
+
+# File where the metadata cache is kept between runs
+METADATA_CACHE_FILE = os.path.join(
+    os.getenv("AI_EDITOR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ai_editor")),
+    "ffprobe.json"
+)
+
+# Hardware decoders to use when FFmpeg supports them, fastest first
+PREFERRED_HWACCELS = ("cuda", "vaapi", "qsv", "videotoolbox")
+
+# Messages FFmpeg prints when a hardware decoder/encoder/filter fails (matched lowercase).
+# Only full messages are matched, so e.g. "No space left on device" or a file named
+# barracuda.mp4 are not mistaken for a hardware error.
+HWACCEL_ERROR_MARKERS = (
+    "failed setup for format",              # hwaccel decoder setup, e.g. "... format cuda"
+    "hwaccel initialisation returned error",
+    "device creation failed",
+    "no device available for decoder",
+    "cannot load libcuda", "cannot load libnvcuvid", "cannot load nvcuda",
+    "cannot load libnvidia-encode", "cannot load nvencodeapi",
+    "cuda_error_",
+    "openencodesessionex failed",
+    "no nvenc capable devices found",
+    "failed to initialise vaapi connection",
+    "error creating a mfx session",
+    "parsed_scale_cuda", "parsed_scale_vaapi", "parsed_scale_qsv", "parsed_hwupload", "parsed_hwdownload",
+)
+
+# File where the detected hardware accelerator is kept between runs
+HWACCEL_CACHE_FILE = os.path.join(os.path.dirname(METADATA_CACHE_FILE), "hwaccel.json")
+
+# Serialises the first detect_hwaccel call; lru_cache alone lets every thread of a pool run the checks
+_hwaccel_lock = threading.Lock()
 
 def generate_shot_list(raw_footage_info):
     """
@@ -34,25 +108,148 @@ def generate_shot_list(raw_footage_info):
     }
     return shot_list
 
-def run_ffmpeg_command(command):
+def run_ffmpeg_command(command, capture_stderr=False, input=None):
     """
     Helper function to run an FFmpeg command.
+    
+    FFmpeg writes its output files itself, so stdout is discarded. stderr is
+    shown on the console unless capture_stderr is True, in which case it is
+    available on the returned result (and on the raised CalledProcessError).
+    input, if given, is bytes written to FFmpeg's stdin (for `-i pipe:0`).
     """
+    # Keep FFmpeg quiet: no banner, no per-frame stats, only errors
+    if "-loglevel" not in command:
+        command = [command[0], *QUIET_FFMPEG_FLAGS, *command[1:]]
+    
     print("Running command:", " ".join(command))
-    subprocess.run(command, check=True)
+    return subprocess.run(
+        command,
+        check=True,
+        input=input,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE if capture_stderr else None
+    )
 
-def trim_video(input_file, start_time, end_time, output_file):
+def detect_hwaccel(cache_file=HWACCEL_CACHE_FILE):
+    """
+    Returns the preferred hardware accelerator that is usable on this machine, or None.
+    
+    Builds list accelerators whether or not a matching device exists, so each
+    listed one is checked by creating its device for a one-frame test run.
+    The answer is cached in cache_file so the checks only run once.
+    Set AI_EDITOR_HWACCEL=0 to always use the CPU. Safe to call from several threads.
+    """
+    with _hwaccel_lock:
+        return _detect_hwaccel(cache_file)
+
+@functools.lru_cache(maxsize=1)
+def _detect_hwaccel(cache_file):
+    """
+    Does the work of detect_hwaccel; call it with _hwaccel_lock held.
+    """
+    if os.getenv("AI_EDITOR_HWACCEL", "1") == "0":
+        return None
+    
+    try:
+        with open(cache_file, "r") as f:
+            return json.load(f)["usable_hwaccel"]
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    try:
+        result = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-hwaccels"],
+            check=True, capture_output=True, text=True
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    
+    # Output is a header line followed by one accelerator name per line
+    available = {line.strip() for line in result.stdout.splitlines()[1:]}
+    hwaccel = next(
+        (name for name in PREFERRED_HWACCELS if name in available and _hwaccel_device_works(name)),
+        None
+    )
+    
+    # Write to a temporary file and rename it, so other processes never read a partial file
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"usable_hwaccel": hwaccel}, f)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        pass
+    return hwaccel
+
+def _hwaccel_device_works(hwaccel):
+    """
+    Checks that FFmpeg can create a device for hwaccel by running a one-frame null encode.
+    """
+    command = [
+        FFMPEG_BIN, "-hide_banner", "-loglevel", "error",
+        "-init_hw_device", hwaccel,
+        "-f", "lavfi", "-i", "nullsrc=s=64x64",
+        "-frames:v", "1", "-f", "null", "-"
+    ]
+    try:
+        subprocess.run(command, check=True, stdin=subprocess.DEVNULL,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (subprocess.CalledProcessError, OSError):
+        return False
+    return True
+
+def run_ffmpeg_command_hwaccel(command, hw_command=None):
+    """
+    Runs an FFmpeg command with hardware decoding, falling back to the CPU.
+    
+    command is the CPU-only command. hw_command, if given, is a fully
+    hardware-specific variant to try first; otherwise `-hwaccel` is added in
+    front of the first input of command. If the hardware run fails because of
+    the hardware (e.g. the decoder or encoder cannot handle the input), command
+    is run as is; any other failure is raised. command must overwrite its
+    output (-y), since the failed run may already have created it.
+    """
+    hwaccel = detect_hwaccel()
+    if hwaccel is None:
+        return run_ffmpeg_command(command)
+    
+    if hw_command is None:
+        first_input = command.index("-i")
+        hw_command = command[:first_input] + ["-hwaccel", hwaccel] + command[first_input:]
+    
+    try:
+        return run_ffmpeg_command(hw_command, capture_stderr=True)
+    except subprocess.CalledProcessError as e:
+        stderr = (e.stderr or b"").decode(errors="replace")
+        if not any(marker in stderr.lower() for marker in HWACCEL_ERROR_MARKERS):
+            print(stderr, end="")
+            raise
+        print(f"Hardware-accelerated run failed ({stderr.strip()}), retrying on the CPU")
+        return run_ffmpeg_command(command)
+
+def trim_video(input_file, start_time, end_time, output_file, accurate=False):
     """
     Trims the input video based on start and end times.
-    Uses FFmpeg's copy codec to avoid re-encoding if possible.
+    
+    The start and end are given before -i, so FFmpeg seeks straight to the cut
+    instead of decoding everything before it. By default the streams are copied,
+    which cuts on the nearest keyframe; with accurate=True the clip is re-encoded
+    and FFmpeg decodes from that keyframe to the exact start frame.
     """
     command = [
-        "ffmpeg", "-y", "-i", input_file,
+        FFMPEG_BIN, "-y",
         "-ss", start_time,
         "-to", end_time,
-        "-c", "copy",
-        output_file
+        "-i", input_file,
     ]
+    if accurate:
+        command += ["-c:v", "libx264", "-c:a", "aac"]
+    else:
+        command += ["-c", "copy", "-avoid_negative_ts", "make_zero"]
+    command.append(output_file)
+    
     run_ffmpeg_command(command)
     return output_file
 
@@ -65,34 +262,63 @@ def add_transition(clip1, clip2, transition, output_file):
     """
     # This is a simplified version; real transitions require more advanced FFmpeg filters.
     command = [
-        "ffmpeg", "-y",
+        FFMPEG_BIN, "-y",
         "-i", clip1,
         "-i", clip2,
         "-filter_complex", "[0:v][1:v]concat=n=2:v=1:a=0",
         output_file
     ]
-    run_ffmpeg_command(command)
+    run_ffmpeg_command_hwaccel(command)
     return output_file
 
 def combine_clips(clip_files, output_file):
     """
     Combines multiple video clips into one file.
     
-    Creates a temporary text file listing all the clips.
+    The list of clips is fed to FFmpeg's concat demuxer over stdin.
     """
-    list_filename = "clips.txt"
-    with open(list_filename, "w") as f:
-        for clip in clip_files:
-            f.write(f"file '{os.path.abspath(clip)}'\n")
+    manifest = "".join(f"file '{os.path.abspath(clip)}'\n" for clip in clip_files).encode()
     
     command = [
-        "ffmpeg", "-y", "-f", "concat", "-safe", "0",
-        "-i", list_filename,
-        "-c", "copy",
+        FFMPEG_BIN, "-y", "-f", "concat", "-safe", "0",
+        "-protocol_whitelist", "pipe,file",
+        "-i", "pipe:0",
+        "-c", "copy", "-movflags", "+faststart",
         output_file
     ]
-    run_ffmpeg_command(command)
-    os.remove(list_filename)
+    run_ffmpeg_command(command, input=manifest)
+    return output_file
+
+def trim_and_combine_clips(shots, output_file):
+    """
+    Trims and combines multiple video clips into one file in a single stream-copy pass.
+    
+    Instead of writing each trimmed clip to an intermediate file, the in/out points are
+    given to FFmpeg's concat demuxer (inpoint/outpoint directives), which reads only the
+    needed part of each clip.
+    
+    Args:
+        shots: List of dictionaries with "filename", "start" and "end".
+        output_file: Path to save the combined video.
+        
+    Returns:
+        Path to the combined video file.
+    """
+    manifest = "".join(
+        f"file '{os.path.abspath(shot['filename'])}'\n"
+        f"inpoint {shot['start']}\n"
+        f"outpoint {shot['end']}\n"
+        for shot in shots
+    ).encode()
+    
+    command = [
+        FFMPEG_BIN, "-y", "-f", "concat", "-safe", "0",
+        "-protocol_whitelist", "pipe,file",
+        "-i", "pipe:0",
+        "-c", "copy", "-movflags", "+faststart",
+        output_file
+    ]
+    run_ffmpeg_command(command, input=manifest)
     return output_file
 
 def add_audio(input_video, audio_file, output_file):
@@ -102,27 +328,129 @@ def add_audio(input_video, audio_file, output_file):
     This function maps the video from the input and the audio from the provided audio file.
     """
     command = [
-        "ffmpeg", "-y", "-i", input_video, "-i", audio_file,
+        FFMPEG_BIN, "-y", "-i", input_video, "-i", audio_file,
         "-c:v", "copy", "-c:a", "aac",
         "-map", "0:v:0", "-map", "1:a:0",
+        "-movflags", "+faststart",
         output_file
     ]
     run_ffmpeg_command(command)
     return output_file
 
 
+def clips_are_stream_compatible(clip_files):
+    """
+    Checks whether clips can be joined with stream copy (no re-encoding).
+    
+    Args:
+        clip_files: List of paths to video files.
+        
+    Returns:
+        True if all clips share the same video codec, resolution, frame rate and audio codec.
+    """
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        all_metadata = list(executor.map(extract_video_metadata_cached, clip_files))
+    
+    if not all_metadata or any(metadata is None for metadata in all_metadata):
+        return False
+    
+    stream_keys = ("video_codec", "resolution", "fps", "audio_codec")
+    first = tuple(all_metadata[0].get(key) for key in stream_keys)
+    return all(tuple(metadata.get(key) for key in stream_keys) == first for metadata in all_metadata[1:])
+
+
+def assemble_shot_list(shot_list, output_file, target_resolution='1080p'):
+    """
+    Trims, scales, concatenates and adds background music to the shots of a shot
+    list in a single FFmpeg invocation, without intermediate files.
+    
+    Each clip is opened with input-side seeking (-ss/-to before -i), so only the
+    needed part is decoded, and one filter_complex scales every clip to the target
+    resolution (padding to keep the aspect ratio, as in scale_video) and
+    concatenates them. If the shot list has background music, it replaces the
+    clips' audio; otherwise the clips' own audio is concatenated along with the
+    video, provided every clip has an audio stream.
+    
+    Args:
+        shot_list: Dictionary with a "shots" list (filename, start, end) and an optional "audio" entry.
+        output_file: Path to save the final video.
+        target_resolution: String like '1080p', '4k', etc. Default is '1080p'.
+        
+    Returns:
+        Path to the final video file.
+    """
+    shots = shot_list["shots"]
+    bgm = shot_list.get("audio", {}).get("bgm")
+    target_width, target_height = get_resolution_dimensions(target_resolution)
+    
+    command = [FFMPEG_BIN, "-y"]
+    for shot in shots:
+        command += ["-ss", shot["start"], "-to", shot["end"], "-i", shot["filename"]]
+    if bgm:
+        command += ["-i", bgm]
+    
+    # The concat filter needs every input at the same size and sample aspect ratio
+    scale_filters = "".join(
+        f"[{i}:v]scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,"
+        f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2,setsar=1[v{i}];"
+        for i in range(len(shots))
+    )
+    
+    # Concatenating the clips' audio needs an audio stream in every clip
+    concat_audio = False
+    if not bgm:
+        with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+            all_metadata = list(executor.map(extract_video_metadata_cached, [shot["filename"] for shot in shots]))
+        concat_audio = all(metadata and metadata.get("audio_codec", "unknown") != "unknown" for metadata in all_metadata)
+        if not concat_audio:
+            print("Not every clip has an audio stream; the output will have no audio")
+    
+    if concat_audio:
+        inputs = "".join(f"[v{i}][{i}:a]" for i in range(len(shots)))
+        filter_graph = f"{scale_filters}{inputs}concat=n={len(shots)}:v=1:a=1[vout][aout]"
+        command += [
+            "-filter_complex", filter_graph,
+            "-map", "[vout]", "-map", "[aout]"
+        ]
+    else:
+        # Video only from the clips; audio (if any) from the background music input
+        inputs = "".join(f"[v{i}]" for i in range(len(shots)))
+        filter_graph = f"{scale_filters}{inputs}concat=n={len(shots)}:v=1:a=0[vout]"
+        command += ["-filter_complex", filter_graph, "-map", "[vout]"]
+        if bgm:
+            command += ["-map", f"{len(shots)}:a:0", "-c:a", "aac"]
+    
+    command.append(output_file)
+    run_ffmpeg_command(command)
+    return output_file
+
+
 def get_video_resolution(video_file):
     """
     Gets the resolution of a video file using FFmpeg.
     
+    Results are cached per file and modification time, so probing the same
+    clip again (e.g. in normalize_video_resolutions and then scale_video)
+    does not spawn another ffprobe.
+    
     Args:
         video_file: Path to the video file.
         
     Returns:
         A tuple of (width, height) as integers.
     """
+    try:
+        mtime_ns = os.stat(video_file).st_mtime_ns
+    except OSError as e:
+        print(f"Error getting video resolution: {e}")
+        return None, None
+    return _get_video_resolution_cached(video_file, mtime_ns)
+
+@functools.lru_cache(maxsize=4096)
+def _get_video_resolution_cached(video_file, mtime_ns):
+    """Probes the resolution of video_file; mtime_ns is only part of the cache key."""
     command = [
-        "ffmpeg", "-i", video_file,
+        FFPROBE_BIN, "-i", video_file,
         "-hide_banner", "-loglevel", "error",
         "-select_streams", "v:0",
         "-show_entries", "stream=width,height",
@@ -130,12 +458,16 @@ def get_video_resolution(video_file):
     ]
     
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        width, height = map(int, result.stdout.strip().split(','))
-        return width, height
+        result = subprocess.run(command, capture_output=True, check=True)
     except subprocess.CalledProcessError as e:
         print(f"Error getting video resolution: {e}")
         return None, None
+    
+    match = _RESOLUTION_RE.match(result.stdout)
+    if not match:
+        print(f"Error getting video resolution: unexpected ffprobe output for {video_file}")
+        return None, None
+    return int(match.group(1)), int(match.group(2))
 
 def get_resolution_dimensions(resolution_name):
     """
@@ -172,27 +504,25 @@ def reverse_video(input_file, output_file, with_audio=False):
     Returns:
         Path to the reversed video file.
     """
-    import subprocess
-    
     print(f"Reversing video: {input_file}")
     
     if with_audio:
         # Reverse both video and audio
         command = [
-            "ffmpeg", "-y", "-i", input_file,
+            FFMPEG_BIN, "-y", "-i", input_file,
             "-vf", "reverse", "-af", "areverse",
             output_file
         ]
     else:
         # Reverse only video, keep audio as is (if any)     
         command = [
-            "ffmpeg", "-y", "-i", input_file,
+            FFMPEG_BIN, "-y", "-i", input_file,
             "-vf", "reverse", "-c:a", "copy",
             output_file
         ]
     
     try:
-        subprocess.run(command, check=True, capture_output=True)
+        run_ffmpeg_command(command, capture_stderr=True)
         print(f"Successfully reversed video to: {output_file}")
         return output_file
     except subprocess.CalledProcessError as e:
@@ -201,7 +531,7 @@ def reverse_video(input_file, output_file, with_audio=False):
         return None
 
 
-def scale_video(input_file, output_file, target_resolution='1080p'):
+def scale_video(input_file, output_file, target_resolution='1080p', threads=None):
     """
     Scales a video to the target resolution while maintaining aspect ratio.
     
@@ -209,6 +539,7 @@ def scale_video(input_file, output_file, target_resolution='1080p'):
         input_file: Path to the input video file.
         output_file: Path to save the scaled video.
         target_resolution: String like '1080p', '4k', etc. Default is '1080p'.
+        threads: Optional number of threads ffmpeg may use. Default lets ffmpeg decide.
     
     Returns:
         Path to the scaled video file.
@@ -231,13 +562,26 @@ def scale_video(input_file, output_file, target_resolution='1080p'):
     
     # Scale video maintaining aspect ratio with padding if needed
     command = [
-        "ffmpeg", "-y", "-i", input_file,
+        FFMPEG_BIN, "-y", "-i", input_file,
         "-vf", f"scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2",
         "-c:a", "copy",
-        output_file
     ]
+    if threads:
+        command += ["-threads", str(threads)]
+    command.append(output_file)
     
-    run_ffmpeg_command(command)
+    # With CUDA, decode and scale on the GPU and encode with NVENC; only the padding runs on the CPU
+    hw_command = None
+    if detect_hwaccel() == "cuda":
+        hw_command = [
+            FFMPEG_BIN, "-y", "-hwaccel", "cuda", "-hwaccel_output_format", "cuda", "-i", input_file,
+            "-vf", f"scale_cuda={target_width}:{target_height}:force_original_aspect_ratio=decrease,hwdownload,format=nv12,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2",
+            "-c:v", "h264_nvenc",
+            "-c:a", "copy",
+            output_file
+        ]
+    
+    run_ffmpeg_command_hwaccel(command, hw_command)
     return output_file
 
 
@@ -254,30 +598,53 @@ def normalize_video_resolutions(video_files, output_dir, target_resolution='1080
         List of paths to the normalized video files.
     """
     os.makedirs(output_dir, exist_ok=True)
-    normalized_files = []
+    normalized_files = list(video_files)
     
     target_width, target_height = get_resolution_dimensions(target_resolution)
     
-    for i, video_file in enumerate(video_files):
-        width, height = get_video_resolution(video_file)
-        
+    # Probe all resolutions in parallel up front
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        resolutions = list(executor.map(get_video_resolution, video_files))
+    
+    to_scale = []
+    for i, (video_file, (width, height)) in enumerate(zip(video_files, resolutions)):
         if width is None or height is None:
             print(f"Skipping {video_file} due to resolution detection failure")
-            normalized_files.append(video_file)
-            continue
-            
-        if width == target_width and height == target_height:
+        elif width == target_width and height == target_height:
             print(f"Video {video_file} already at target resolution {target_resolution}")
-            normalized_files.append(video_file)
         else:
-            output_file = os.path.join(output_dir, f"normalized_{i}_{os.path.basename(video_file)}")
-            scaled_file = scale_video(video_file, output_file, target_resolution)
-            normalized_files.append(scaled_file)
+            to_scale.append(i)
+    
+    if not to_scale:
+        return normalized_files
+    
+    # Detect the hardware accelerator once, before the encodes start on several threads
+    detect_hwaccel()
+    
+    # Run the encodes concurrently, splitting the CPU cores between them to avoid oversubscription
+    cpu_count = os.cpu_count() or 4
+    workers = min(len(to_scale), cpu_count)
+    threads_per_worker = max(1, cpu_count // workers)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            i: executor.submit(
+                scale_video,
+                video_files[i],
+                os.path.join(output_dir, f"normalized_{i}_{os.path.basename(video_files[i])}"),
+                target_resolution,
+                threads_per_worker
+            )
+            for i in to_scale
+        }
+        for i, future in futures.items():
+            normalized_files[i] = future.result()
     
     return normalized_files
 
 
-def add_noise_to_video(input_video_path, output_video_path, noise_strength=25):
+def add_noise_to_video(input_video_path, output_video_path, noise_strength=25,
+                       preset="ultrafast", crf=23, tune="zerolatency", threads=0):
     """
     Adds noise to the video using ffmpeg.
 
@@ -285,149 +652,289 @@ def add_noise_to_video(input_video_path, output_video_path, noise_strength=25):
     - input_video_path: str, path to the input video file
     - output_video_path: str, path where the output video will be saved
     - noise_strength: int, strength of the noise to be added (default is 25)
+    - preset: str, libx264 preset; faster presets trade file size for speed (default is "ultrafast")
+    - crf: int, libx264 constant rate factor (default is 23)
+    - tune: str, libx264 tuning, or None for none (default is "zerolatency")
+    - threads: int, encoder threads; 0 lets ffmpeg decide (default is 0)
     """
     try:
         # Construct the ffmpeg command
         command = [
-            "ffmpeg",
+            FFMPEG_BIN, "-y",
             "-i", input_video_path,
             "-vf", f"noise=c0s={noise_strength}:c0f=t+u:c1s=0:c1f=0:c2s=0:c2f=0",
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+        ]
+        if tune:
+            command += ["-tune", tune]
+        command += [
+            "-threads", str(threads),
             "-c:a", "copy",
             output_video_path
         ]
 
         # Execute the command
-        subprocess.run(command, check=True)
+        run_ffmpeg_command_hwaccel(command)
         print(f"Noise added successfully to {output_video_path}")
 
     except subprocess.CalledProcessError as e:
         print(f"An error occurred: {e}")
 
 
-def extract_video_metadata(video_file):
+def _parse_probe_sections(output):
+    """
+    Parses ffprobe's default output format ([FORMAT]/[STREAM] sections of key=value lines)
+    into the same structure ffprobe produces with -of json.
+
+    Args:
+        output: Text output of ffprobe with -of default.
+
+    Returns:
+        A dictionary with a "format" dictionary and a "streams" list.
+    """
+    raw_metadata = {"streams": []}
+    section = None
+    
+    for line in output.splitlines():
+        if line == "[FORMAT]":
+            section = raw_metadata["format"] = {}
+        elif line == "[STREAM]":
+            section = {}
+            raw_metadata["streams"].append(section)
+        elif line.startswith("[/"):
+            section = None
+        elif section is not None and "=" in line:
+            key, value = line.split("=", 1)
+            if value == "N/A":
+                continue
+            section[key] = int(value) if key in ("width", "height") else value
+    
+    return raw_metadata
+
+def _parse_probe_dict(raw_metadata, video_file, file_size=None):
+    """
+    Converts raw ffprobe output into clean, formatted metadata.
+
+    Args:
+        raw_metadata: Dictionary parsed from ffprobe's output (same structure as -of json).
+        video_file: Path to the probed video file.
+        file_size: Optional size of the file in bytes.
+
+    Returns:
+        A dictionary containing clean, formatted metadata relevant for video editing.
+    """
+    # Initialize a clean metadata dictionary
+    metadata = {
+        "filename": os.path.basename(video_file),
+        "filepath": os.path.abspath(video_file),
+        "filesize_mb": 0,
+        "duration": 0,
+        "resolution": "unknown",
+        "aspect_ratio": "unknown",
+        "video_codec": "unknown",
+        "audio_codec": "unknown",
+        "bitrate": "unknown",
+        "fps": 0
+    }
+    
+    # File size in MB
+    if file_size is not None:
+        metadata["filesize_mb"] = round(file_size / (1024 * 1024), 2)
+    
+    # Extract format information
+    if "format" in raw_metadata:
+        format_info = raw_metadata["format"]
+        
+        # Duration in seconds
+        if "duration" in format_info:
+            duration_sec = float(format_info["duration"])
+            metadata["duration"] = duration_sec
+            
+            # Format duration as HH:MM:SS
+            hours, remainder = divmod(duration_sec, 3600)
+            minutes, seconds = divmod(remainder, 60)
+            metadata["duration_formatted"] = f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
+        
+        # Bitrate in Mbps
+        if "bit_rate" in format_info and format_info["bit_rate"].isdigit():
+            bitrate_bps = int(format_info["bit_rate"])
+            metadata["bitrate"] = f"{round(bitrate_bps / 1000000, 2)} Mbps"
+    
+    # Extract stream information
+    if "streams" in raw_metadata:
+        for stream in raw_metadata["streams"]:
+            # Video stream
+            if stream.get("codec_type") == "video":
+                # Resolution
+                if "width" in stream and "height" in stream:
+                    width = stream["width"]
+                    height = stream["height"]
+                    metadata["resolution"] = f"{width}x{height}"
+                    
+                    # Determine common resolution name
+                    metadata["resolution_name"] = next(
+                        (name for min_width, min_height, name in RESOLUTION_THRESHOLDS
+                         if width >= min_width and height >= min_height),
+                        "SD"
+                    )
+                
+                # Aspect ratio
+                if "display_aspect_ratio" in stream:
+                    metadata["aspect_ratio"] = stream["display_aspect_ratio"]
+                
+                # Video codec
+                if "codec_name" in stream:
+                    metadata["video_codec"] = stream["codec_name"]
+                
+                # Frame rate
+                if "avg_frame_rate" in stream:
+                    frame_rate = stream["avg_frame_rate"]
+                    if "/" in frame_rate:
+                        num, den = map(int, frame_rate.split("/"))
+                        if den != 0:  # Avoid division by zero
+                            metadata["fps"] = round(num / den, 2)
+            
+            # Audio stream
+            elif stream.get("codec_type") == "audio":
+                # Audio codec
+                if "codec_name" in stream:
+                    metadata["audio_codec"] = stream["codec_name"]
+    
+    return metadata
+
+def extract_video_metadata(video_file, file_size=None):
     """
     Extracts metadata from a single video file using ffmpeg.
 
     Args:
         video_file: Path to the video file.
+        file_size: Optional size of the file in bytes, if already known (e.g. from a directory scan).
 
     Returns:
         A dictionary containing clean, formatted metadata relevant for video editing.
     """
     # Get basic stream and format information
     command = [
-        "ffprobe", "-v", "error",
-        "-show_entries", "format=duration,bit_rate,size:stream=width,height,codec_name,codec_type,avg_frame_rate,display_aspect_ratio",
-        "-of", "json", video_file
+        FFPROBE_BIN, "-v", "error",
+        "-show_entries", "format=duration,bit_rate:stream=width,height,codec_name,codec_type,avg_frame_rate,display_aspect_ratio",
+        "-of", "default", video_file
     ]
 
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        raw_metadata = json.loads(result.stdout)
-        
-        # Initialize a clean metadata dictionary
-        metadata = {
-            "filename": os.path.basename(video_file),
-            "filepath": os.path.abspath(video_file),
-            "filesize_mb": 0,
-            "duration": 0,
-            "resolution": "unknown",
-            "aspect_ratio": "unknown",
-            "video_codec": "unknown",
-            "audio_codec": "unknown",
-            "bitrate": "unknown",
-            "fps": 0
-        }
+        if file_size is None:
+            file_size = os.path.getsize(video_file)
         
-        # Extract format information
-        if "format" in raw_metadata:
-            format_info = raw_metadata["format"]
-            
-            # Duration in seconds
-            if "duration" in format_info:
-                duration_sec = float(format_info["duration"])
-                metadata["duration"] = duration_sec
-                
-                # Format duration as HH:MM:SS
-                hours, remainder = divmod(duration_sec, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                metadata["duration_formatted"] = f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
-            
-            # File size in MB
-            if "size" in format_info:
-                size_bytes = int(format_info["size"])
-                metadata["filesize_mb"] = round(size_bytes / (1024 * 1024), 2)
-            
-            # Bitrate in Mbps
-            if "bit_rate" in format_info and format_info["bit_rate"].isdigit():
-                bitrate_bps = int(format_info["bit_rate"])
-                metadata["bitrate"] = f"{round(bitrate_bps / 1000000, 2)} Mbps"
-        
-        # Extract stream information
-        if "streams" in raw_metadata:
-            for stream in raw_metadata["streams"]:
-                # Video stream
-                if stream.get("codec_type") == "video":
-                    # Resolution
-                    if "width" in stream and "height" in stream:
-                        width = stream["width"]
-                        height = stream["height"]
-                        metadata["resolution"] = f"{width}x{height}"
-                        
-                        # Determine common resolution name
-                        if width >= 7680 and height >= 4320:
-                            metadata["resolution_name"] = "8K"
-                        elif width >= 3840 and height >= 2160:
-                            metadata["resolution_name"] = "4K"
-                        elif width >= 2560 and height >= 1440:
-                            metadata["resolution_name"] = "2K"
-                        elif width >= 1920 and height >= 1080:
-                            metadata["resolution_name"] = "1080p"
-                        elif width >= 1280 and height >= 720:
-                            metadata["resolution_name"] = "720p"
-                        elif width >= 854 and height >= 480:
-                            metadata["resolution_name"] = "480p"
-                        else:
-                            metadata["resolution_name"] = "SD"
-                    
-                    # Aspect ratio
-                    if "display_aspect_ratio" in stream:
-                        metadata["aspect_ratio"] = stream["display_aspect_ratio"]
-                    
-                    # Video codec
-                    if "codec_name" in stream:
-                        metadata["video_codec"] = stream["codec_name"]
-                    
-                    # Frame rate
-                    if "avg_frame_rate" in stream:
-                        frame_rate = stream["avg_frame_rate"]
-                        if "/" in frame_rate:
-                            num, den = map(int, frame_rate.split("/"))
-                            if den != 0:  # Avoid division by zero
-                                metadata["fps"] = round(num / den, 2)
-                
-                # Audio stream
-                elif stream.get("codec_type") == "audio":
-                    # Audio codec
-                    if "codec_name" in stream:
-                        metadata["audio_codec"] = stream["codec_name"]
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        raw_metadata = _parse_probe_sections(result.stdout)
         
-        return metadata
+        return _parse_probe_dict(raw_metadata, video_file, file_size)
     
     except subprocess.CalledProcessError as e:
         print(f"Error extracting metadata from {video_file}: {e}")
         return None
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON metadata from {video_file}: {e}")
+    except ValueError as e:
+        print(f"Error parsing metadata from {video_file}: {e}")
         return None
+    except OSError as e:
+        print(f"Error reading {video_file}: {e}")
+        return None
+
+def extract_video_metadata_cached(video_file, file_stat=None):
+    """
+    Same as extract_video_metadata, but reuses earlier results for files that have not changed.
+
+    Args:
+        video_file: Path to the video file.
+        file_stat: Optional os.stat_result of the file, if already known (e.g. from a directory scan).
+
+    Returns:
+        A dictionary containing clean, formatted metadata relevant for video editing.
+    """
+    try:
+        if file_stat is None:
+            file_stat = os.stat(video_file)
+    except OSError:
+        return extract_video_metadata(video_file)
+    
+    # Cache key changes whenever the file is modified
+    key = f"{os.path.abspath(video_file)}|{file_stat.st_mtime_ns}|{file_stat.st_size}"
+    if key not in _metadata_cache:
+        metadata = extract_video_metadata(video_file, file_stat.st_size)
+        if not metadata:
+            return None
+        _metadata_cache[key] = metadata
+    
+    return dict(_metadata_cache[key])
+
+def _write_json(path, data, indent=False):
+    """
+    Writes data to a JSON file, using orjson when available.
+    """
+    if orjson:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2 if indent else None)
 
-def extract_metadata_from_folder(folder_path, output_json=None):
+def load_metadata_cache(cache_file=METADATA_CACHE_FILE):
+    """
+    Loads previously extracted metadata from a JSON cache file, if it exists.
+
+    Args:
+        cache_file: Path to the JSON cache file. Defaults to METADATA_CACHE_FILE.
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+        _metadata_cache.update(orjson.loads(data) if orjson else json.loads(data))
+    except (OSError, ValueError):
+        pass
+
+def save_metadata_cache(cache_file=METADATA_CACHE_FILE):
+    """
+    Saves the extracted metadata to a JSON cache file.
+
+    Args:
+        cache_file: Path to the JSON cache file. Defaults to METADATA_CACHE_FILE.
+    """
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        _write_json(cache_file, _metadata_cache)
+    except OSError as e:
+        print(f"Warning: Could not save metadata cache: {e}")
+
+def _looks_like_video(path):
+    """
+    Checks the first bytes of a file against the signatures of the supported
+    containers, so misnamed or empty files are skipped without running ffprobe.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            header = os.read(fd, 16)
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+    
+    return (
+        header[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip")  # MP4 / MOV / M4V
+        or header.startswith(b"\x1aE\xdf\xa3")  # Matroska / WebM
+        or (header.startswith(b"RIFF") and header[8:12] == b"AVI ")  # AVI
+        or header.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11")  # ASF / WMV
+        or header.startswith(b"FLV")
+        or header.startswith(b"OggS")
+    )
+
+def extract_metadata_from_folder(folder_path, output_json=None, use_cache=True):
     """
     Extracts metadata from all video files in a specified folder.
 
     Args:
         folder_path: Path to the folder containing video files.
         output_json: Optional path to save the JSON output file.
+        use_cache: Whether to reuse metadata of unchanged files from earlier runs. Default is True.
 
     Returns:
         A dictionary with clean metadata for all videos in the folder.
@@ -443,29 +950,42 @@ def extract_metadata_from_folder(folder_path, output_json=None):
         "videos": []
     }
     
-    # Supported video extensions
-    video_extensions = ('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v')
-    
     # Find all video files in the folder
-    video_files = []
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith(video_extensions):
-            video_files.append(os.path.join(folder_path, filename))
+    with os.scandir(folder_path) as entries:
+        video_entries = sorted(
+            (entry for entry in entries
+             if os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS and entry.is_file()
+             and _looks_like_video(entry.path)),
+            key=lambda entry: entry.name
+        )
+    video_files = [entry.path for entry in video_entries]
     
     # Update total videos count
     all_metadata["total_videos"] = len(video_files)
     
-    # Process each video file
-    for i, video_path in enumerate(video_files):
-        print(f"Processing video {i+1}/{len(video_files)}: {os.path.basename(video_path)}")
-        metadata = extract_video_metadata(video_path)
+    if use_cache:
+        load_metadata_cache()
+    
+    # Probe the video files in parallel; ffprobe is short-lived and mostly waits on I/O,
+    # so threads are enough. Results come back in the original file order.
+    # The directory entries already carry the file stats, so they are passed along.
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if use_cache:
+            results = executor.map(extract_video_metadata_cached, video_files, (entry.stat() for entry in video_entries))
+        else:
+            results = executor.map(extract_video_metadata, video_files, (entry.stat().st_size for entry in video_entries))
         
-        if metadata:
-            all_metadata["videos"].append(metadata)
+        for i, (video_path, metadata) in enumerate(zip(video_files, results)):
+            print(f"Processed video {i+1}/{len(video_files)}: {os.path.basename(video_path)}")
             
-            # Add to total duration
-            if "duration" in metadata:
-                all_metadata["total_duration_seconds"] += metadata["duration"]
+            if metadata:
+                all_metadata["videos"].append(metadata)
+    
+    all_metadata["total_duration_seconds"] = sum(video.get("duration", 0) for video in all_metadata["videos"])
+    
+    if use_cache:
+        save_metadata_cache()
     
     # Format total duration
     total_seconds = all_metadata["total_duration_seconds"]
@@ -475,8 +995,7 @@ def extract_metadata_from_folder(folder_path, output_json=None):
     
     # Save to JSON file if requested
     if output_json:
-        with open(output_json, 'w') as f:
-            json.dump(all_metadata, f, indent=2)
+        _write_json(output_json, all_metadata, indent=True)
         print(f"Metadata saved to {output_json}")
     
     return all_metadata
@@ -490,19 +1009,21 @@ def main():
     # Generate a shot list (this is where you'd call your LLM if integrated)
     shot_list = generate_shot_list(raw_footage_info)
     
-    processed_clips = []
+    clip_files = [shot["filename"] for shot in shot_list["shots"]]
     
-    # Process each shot from the shot list
-    for idx, shot in enumerate(shot_list["shots"]):
-        trimmed_file = f"trimmed_{idx}.mp4"
-        print(f"Trimming {shot['filename']} from {shot['start']} to {shot['end']}")
-        trim_video(shot["filename"], shot["start"], shot["end"], trimmed_file)
-        processed_clips.append(trimmed_file)
+    if not clips_are_stream_compatible(clip_files):
+        # Trim, combine and add background music in one re-encoding FFmpeg pass
+        final_output = "final_output.mp4"
+        print("Assembling shot list into", final_output)
+        assemble_shot_list(shot_list, final_output)
+        print("Video editing completed. Final output file:", final_output)
+        return
     
-    # Combine the processed clips into one video file
+    # All clips share codecs and format, so everything can be stream-copied without re-encoding.
+    # Trim and combine the clips in one pass, without intermediate trimmed files
     combined_file = "combined.mp4"
-    print("Combining clips into", combined_file)
-    combine_clips(processed_clips, combined_file)
+    print("Trimming and combining clips into", combined_file)
+    trim_and_combine_clips(shot_list["shots"], combined_file)
     
     # Example: Optionally add audio if background music is provided in the shot list
     if "audio" in shot_list and shot_list["audio"].get("bgm"):
@@ -518,10 +1039,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Extract metadata from video files in a folder')
     parser.add_argument('folder', help='Path to the folder containing video files')
     parser.add_argument('--output', '-o', help='Path to save the JSON output file')
+    parser.add_argument('--no-cache', action='store_true', help='Probe every file again instead of reusing cached metadata')
     
     args = parser.parse_args()
     
-    metadata = extract_metadata_from_folder(args.folder, args.output)
+    metadata = extract_metadata_from_folder(args.folder, args.output, use_cache=not args.no_cache)
     
     if not args.output:
         # Print a summary to console if not saving to file
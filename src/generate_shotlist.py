@@ -3,35 +3,130 @@ import json
 import os
 import asyncio
 import argparse
-from openai import AzureOpenAI
-from dotenv import load_dotenv
+import re
+from openai import OpenAIError
+import openai_utils
 
-# Load environment variables
-load_dotenv()
+# fastjsonschema compiles the schema into Python code, which validates much faster;
+# fall back to checking the structure by hand if it is not installed
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
 
-# Azure OpenAI configuration
-AZURE_ENDPOINT = "https://ai-coe-openai-models-latest.openai.azure.com/"
-AZURE_MODEL = "gpt-4o-mini"
-AZURE_DEPLOYMENT = "gpt-4o-mini"
-AZURE_API_VERSION = "2024-12-01-preview"
+# Fields that may hold a video's description in the analysis JSON, in order of preference
+DESCRIPTION_FIELDS = ("video_description", "content_analysis", "description", "content")
 
-# Create OpenAI client
-openai_client = AzureOpenAI(
-    api_version=AZURE_API_VERSION,
-    azure_endpoint=AZURE_ENDPOINT,
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-)
+# Maximum number of shot lists generated at the same time by generate_shot_lists
+MAX_CONCURRENCY = 10
 
-def validate_shot_list_format(shot_list, all_filenames=None):
+# Attempts for an API call that fails with a transient error
+MAX_RETRIES = 3
+
+# Time values in a shot list are HH:MM:SS
+TIME_PATTERN = "^[0-9]+:[0-5]?[0-9]:[0-5]?[0-9]$"
+_TIME_RE = re.compile(TIME_PATTERN)
+_TIME_SCHEMA = {"type": "string", "pattern": TIME_PATTERN}
+
+# Keys every shot must have, and those holding HH:MM:SS times
+SHOT_KEYS = ("filename", "description", "start_time", "end_time", "duration", "transition_in", "transition_out")
+TIME_KEYS = ("start_time", "end_time", "duration")
+
+# JSON schema of the shot list returned by the model
+SHOT_LIST_SCHEMA = {
+    "type": "object",
+    "required": ["project_name", "narrative_theme", "shots"],
+    "properties": {
+        "shots": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": list(SHOT_KEYS),
+                "properties": {key: _TIME_SCHEMA for key in TIME_KEYS}
+            }
+        }
+    }
+}
+
+# Structured output format for the model, so the reply is always JSON with the shot list structure.
+# Strict mode needs every property listed and required, and does not check the time format.
+SHOT_LIST_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "shot_list",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "project_name": {"type": "string"},
+                "narrative_theme": {"type": "string"},
+                "shots": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {key: {"type": "string"} for key in SHOT_KEYS},
+                        "required": list(SHOT_KEYS),
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": SHOT_LIST_SCHEMA["required"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Compiled once at import
+_validate_schema = fastjsonschema.compile(SHOT_LIST_SCHEMA) if fastjsonschema else None
+
+# System prompt for shot list generation
+SYSTEM_PROMPT = """You are a professional video editor.
+Your task is to create a shot list in JSON format that tells a coherent story using the available footage.
+Analyze the content of each video and suggest an order, timestamps, and transitions that would create a compelling narrative.
+
+IMPORTANT: You MUST include EVERY SINGLE video file in your shot list. Do not skip any footage.
+
+The output should be valid JSON with the following structure:
+{
+  "project_name": "A descriptive name based on the content",
+  "narrative_theme": "A brief description of the story or theme",
+  "shots": [
+    {
+      "filename": "original_filename.mp4",
+      "description": "Brief description of this shot's purpose in the narrative",
+      "start_time": "HH:MM:SS",
+      "end_time": "HH:MM:SS",
+      "duration": "HH:MM:SS",
+      "transition_in": "fade in/dissolve/cut/etc",
+      "transition_out": "fade out/dissolve/cut/etc"
+    }
+  ]
+}
+Use realistic timestamps based on the actual duration of each video.
+Be creative but practical in your suggestions.
+If the user provides storyline guidance, follow it closely while creating your shot list.
+
+Remember: EVERY video file must be included in the shot list."""
+
+# User prompt for shot list generation; filled in with guidance_text, videos_text and video_count
+USER_PROMPT_TEMPLATE = """Here are the videos available for editing:{guidance_text}
+
+{videos_text}
+
+Based on these videos, create a shot list in JSON format that tells a coherent story.
+The shot list should suggest an order for the footage, with appropriate in/out points and transitions.
+
+IMPORTANT: You MUST include ALL {video_count} video files in your shot list.
+
+Return ONLY the JSON with no additional text."""
+
+def _check_structure(shot_list):
     """
-    Validate that the shot list JSON matches the expected format.
+    Check the shot list structure by hand, for when fastjsonschema is not installed.
     
-    Args:
-        shot_list: Dictionary containing the shot list
-        all_filenames: Optional list of all filenames that should be included
-        
     Returns:
-        tuple: (is_valid, error_message) where is_valid is a boolean and error_message is None if valid
+        tuple: (is_valid, error_message)
     """
     # Check required top-level keys
     required_keys = ["project_name", "narrative_theme", "shots"]
@@ -43,40 +138,63 @@ def validate_shot_list_format(shot_list, all_filenames=None):
     if not isinstance(shot_list["shots"], list):
         return False, "'shots' must be an array"
     
-    if len(shot_list["shots"]) == 0:
+    shots = shot_list["shots"]
+    if len(shots) == 0:
         return False, "'shots' array cannot be empty"
     
-    # Check each shot
-    for i, shot in enumerate(shot_list["shots"]):
+    # Fast path: check each key and time column across all shots, stopping at the first failure
+    if all(key in shot for key in SHOT_KEYS for shot in shots) and all(
+        isinstance(shot[key], str) and _TIME_RE.match(shot[key]) for key in TIME_KEYS for shot in shots
+    ):
+        return True, None
+    
+    # Something is wrong; check each shot to find the offending one
+    for i, shot in enumerate(shots):
         # Check required shot keys
-        shot_keys = ["filename", "description", "start_time", "end_time", "duration", 
-                     "transition_in", "transition_out"]
-        for key in shot_keys:
+        for key in SHOT_KEYS:
             if key not in shot:
                 return False, f"Shot {i+1} is missing required key: '{key}'"
         
         # Validate time format (HH:MM:SS)
-        time_keys = ["start_time", "end_time", "duration"]
-        for key in time_keys:
+        for key in TIME_KEYS:
             time_str = shot[key]
             if not isinstance(time_str, str):
                 return False, f"Shot {i+1}: '{key}' must be a string"
             
-            # Check time format
-            parts = time_str.split(":")
-            if len(parts) != 3:
+            if not _TIME_RE.match(time_str):
                 return False, f"Shot {i+1}: '{key}' must be in format 'HH:MM:SS'"
-            
-            try:
-                hours, minutes, seconds = map(int, parts)
-                if not (0 <= hours and 0 <= minutes < 60 and 0 <= seconds < 60):
-                    return False, f"Shot {i+1}: '{key}' contains invalid time values"
-            except ValueError:
-                return False, f"Shot {i+1}: '{key}' must contain numeric values"
     
-    # Check if all filenames are included
+    return True, None
+
+def _validate_structure(shot_list):
+    """
+    Validate the keys, types and time formats of a shot list.
+    
+    Returns:
+        tuple: (is_valid, error_message)
+    """
+    if not _validate_schema:
+        return _check_structure(shot_list)
+    
+    try:
+        _validate_schema(shot_list)
+    except fastjsonschema.JsonSchemaException as e:
+        return False, e.message
+    return True, None
+
+def _validate_coverage(shot_list, all_filenames=None, shot_filenames=None):
+    """
+    Validate that every file in all_filenames is used in the shot list.
+    
+    shot_filenames is the set of filenames used in the shot list, if the caller
+    already has it.
+    
+    Returns:
+        tuple: (is_valid, error_message)
+    """
     if all_filenames:
-        shot_filenames = [shot["filename"] for shot in shot_list["shots"]]
+        if shot_filenames is None:
+            shot_filenames = {shot["filename"] for shot in shot_list["shots"]}
         missing_files = [f for f in all_filenames if f not in shot_filenames]
         
         if missing_files:
@@ -84,219 +202,435 @@ def validate_shot_list_format(shot_list, all_filenames=None):
     
     return True, None
 
-def generate_shot_list_from_json(input_json_path, output_json_path=None, storyline_guidance=None):
+def validate_shot_list_format(shot_list, all_filenames=None):
     """
-    Generate a shot list narrative in JSON format based on an existing JSON file with video descriptions.
+    Validate that the shot list JSON matches the expected format.
     
     Args:
-        input_json_path: Path to the input JSON file with video descriptions
-        output_json_path: Optional path to save the shot list JSON file
-        storyline_guidance: Optional string with creative direction for the storyline
+        shot_list: Dictionary containing the shot list
+        all_filenames: Optional list of all filenames that should be included
         
     Returns:
-        Dictionary containing the shot list in JSON format
+        tuple: (is_valid, error_message) where is_valid is a boolean and error_message is None if valid
+    """
+    is_valid, error_message = _validate_structure(shot_list)
+    if not is_valid:
+        return False, error_message
+    
+    # Check if all filenames are included
+    return _validate_coverage(shot_list, all_filenames)
+
+def _load_videos_info(input_json_path):
+    """
+    Load the video descriptions from an analysis JSON file.
+    
+    Args:
+        input_json_path: Path to the input JSON file with video descriptions
+    
+    Returns:
+        tuple: (videos_info, all_filenames), or (None, None) if there are no usable descriptions
     """
     print(f"\nLoading video descriptions from: {input_json_path}")
     
-    try:
-        # Load the input JSON file
-        with open(input_json_path, 'r') as f:
-            analysis_data = json.load(f)
+    # Load the input JSON file
+    with open(input_json_path, 'rb') as f:
+        analysis_data = openai_utils.load_json(f.read())
+    
+    if not analysis_data or "videos" not in analysis_data or not analysis_data["videos"]:
+        print("No video data found in the input JSON file")
+        return None, None
+    
+    # Extract relevant information for the prompt
+    videos_info = []
+    all_filenames = []
+    
+    for video in analysis_data["videos"]:
+        # Keep track of all filenames
+        if "filename" in video:
+            all_filenames.append(video["filename"])
         
-        if not analysis_data or "videos" not in analysis_data or not analysis_data["videos"]:
-            print("No video data found in the input JSON file")
-            return None
+        # Try different possible field names for the description
+        description = next((video[field] for field in DESCRIPTION_FIELDS if video.get(field)), None)
         
-        # Extract relevant information for the prompt
-        videos_info = []
-        all_filenames = []
+        # If no description field found, check if there are first_frame and last_frame descriptions
+        if not description:
+            first_desc = video.get("first_frame", {}).get("description", "")
+            last_desc = video.get("last_frame", {}).get("description", "")
+            if first_desc and last_desc:
+                description = f"First frame: {first_desc}\n\nLast frame: {last_desc}"
         
-        for video in analysis_data["videos"]:
-            # Keep track of all filenames
-            if "filename" in video:
-                all_filenames.append(video["filename"])
-            
-            # Try different possible field names for the description
-            description = None
-            for field in ["video_description", "content_analysis", "description", "content"]:
-                if field in video and video[field]:
-                    description = video[field]
-                    break
+        if description:
+            # Get metadata if available
+            metadata = video.get("metadata", {})
+            duration_formatted = metadata.get("duration_formatted", "unknown")
+            duration = metadata.get("duration", 0)
             
-            # If no description field found, check if there are first_frame and last_frame descriptions
-            if not description and "first_frame" in video and "last_frame" in video:
-                first_desc = video["first_frame"].get("description", "")
-                last_desc = video["last_frame"].get("description", "")
-                if first_desc and last_desc:
-                    description = f"First frame: {first_desc}\n\nLast frame: {last_desc}"
+            video_info = {
+                "filename": video["filename"],
+                "content": description,
+                "duration": duration_formatted,
+                "duration_seconds": duration
+            }
+            videos_info.append(video_info)
+    
+    if not videos_info:
+        print("No usable video descriptions found in the input JSON file")
+        return None, None
+    
+    print(f"Found {len(videos_info)} videos with descriptions")
+    return videos_info, all_filenames
+
+def _build_messages(videos_info, storyline_guidance=None):
+    """
+    Build the chat messages asking the model for a shot list of the given videos.
+    
+    Args:
+        videos_info: List of video dictionaries as returned by _load_videos_info
+        storyline_guidance: Optional string with creative direction for the storyline
+    
+    Returns:
+        List of chat messages
+    """
+    # Create a prompt for the AI to generate a shot list
+    videos_text = "".join(
+        f"Video {i+1}: {video['filename']}\n"
+        f"Duration: {video['duration']}\n"
+        f"Content: {video['content']}\n\n"
+        for i, video in enumerate(videos_info)
+    )
+    
+    # Add storyline guidance if provided
+    guidance_text = ""
+    if storyline_guidance:
+        guidance_text = f"\nStoryline Guidance:\n{storyline_guidance}\n\n"
+        print(f"Using provided storyline guidance: {storyline_guidance}")
+    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT_TEMPLATE.format(
+            guidance_text=guidance_text,
+            videos_text=videos_text,
+            video_count=len(videos_info)
+        )}
+    ]
+
+def _cache_key(messages):
+    """
+    Hash the model and prompt into a cache key for the reply.
+    """
+    return openai_utils.cache_key(json.dumps(messages, sort_keys=True))
+
+async def _call_llm(messages):
+    """
+    Request a shot list from the model, retrying transient errors (see openai_utils.call_with_retry).
+    
+    Args:
+        messages: Chat messages as returned by _build_messages
+        
+    Returns:
+        The message content of the model's reply
+    """
+    response = await openai_utils.call_with_retry(
+        openai_utils.get_openai_client().chat.completions.create,
+        retries=MAX_RETRIES,
+        model=openai_utils.AZURE_DEPLOYMENT,
+        messages=messages,
+        max_tokens=2000,
+        temperature=0.7,
+        response_format=SHOT_LIST_RESPONSE_FORMAT
+    )
+    return response.choices[0].message.content
+
+def _is_repairable(shot_list):
+    """
+    Check that an invalid shot list still has a list of shots with filenames,
+    so missing files can be added and the rest of it used as is.
+    """
+    shots = shot_list.get("shots") if isinstance(shot_list, dict) else None
+    return isinstance(shots, list) and all(
+        isinstance(shot, dict) and isinstance(shot.get("filename"), str) for shot in shots
+    )
+
+def _process_response(shot_list_text, videos_info, all_filenames, output_json_path=None, verbose=False,
+                      cache_key=None):
+    """
+    Parse, validate and (if needed) repair the shot list returned by the model, then save it.
+    
+    Args:
+        shot_list_text: Message content returned by the model
+        videos_info: List of video dictionaries as returned by _load_videos_info
+        all_filenames: List of all filenames that should be included
+        output_json_path: Optional path to save the shot list JSON file
+        verbose: Print the shot list if it is not saved to a file
+        cache_key: If given, the reply is cached under this key once it is known to be usable
+    
+    Returns:
+        Dictionary containing the shot list, or None if the response is not a usable shot list
+        or could not be saved
+    """
+    # The reply has no content if the model refused or it was filtered
+    if shot_list_text is None:
+        print("Error: The model returned no shot list")
+        return None
+    
+    # The response format guarantees JSON, but a truncated reply can still be invalid
+    try:
+        shot_list = json.loads(shot_list_text)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON response: {e}")
+        print("Raw response:")
+        print(shot_list_text)
+        return None
+    
+    # Validate the shot list format
+    structure_valid, error_message = _validate_structure(shot_list)
+    if not structure_valid and not _is_repairable(shot_list):
+        print(f"Error: Generated shot list cannot be used: {error_message}")
+        return None
+    
+    # Only cache replies that can be used, so a bad one is requested again next time
+    if cache_key:
+        openai_utils.write_cache("shot_list", cache_key, shot_list_text)
+    
+    is_valid = structure_valid
+    shot_filenames = {shot["filename"] for shot in shot_list["shots"]}
+    if structure_valid:
+        is_valid, error_message = _validate_coverage(shot_list, all_filenames, shot_filenames)
+    
+    if not is_valid:
+        print(f"Warning: Generated shot list does not match expected format: {error_message}")
+        print("Attempting to fix the format...")
+        
+        # The structure is enforced by the response format; only files the model left out can be fixed
+        # Check for missing files and add them if needed
+        if all_filenames:
+            missing_files = [f for f in all_filenames if f not in shot_filenames]
             
-            if description:
-                # Get metadata if available
-                metadata = video.get("metadata", {})
-                duration_formatted = metadata.get("duration_formatted", "unknown")
-                duration = metadata.get("duration", 0)
+            if missing_files:
+                print(f"Adding missing files to shot list: {', '.join(missing_files)}")
                 
-                video_info = {
-                    "filename": video["filename"],
-                    "content": description,
-                    "duration": duration_formatted,
-                    "duration_seconds": duration
-                }
-                videos_info.append(video_info)
+                # Add missing files to the shot list
+                videos_by_name = {v["filename"]: v for v in videos_info}
+                for filename in missing_files:
+                    # Find the video info for this file
+                    video_info = videos_by_name.get(filename)
+                    
+                    if video_info:
+                        # Add a basic shot for this file
+                        shot_list["shots"].append({
+                            "filename": filename,
+                            "description": f"Added shot from {filename}",
+                            "start_time": "00:00:00",
+                            "end_time": video_info.get("duration_formatted", "00:01:00"),
+                            "duration": video_info.get("duration_formatted", "00:01:00"),
+                            "transition_in": "cut",
+                            "transition_out": "cut"
+                        })
+                        shot_filenames.add(filename)
         
-        if not videos_info:
-            print("No usable video descriptions found in the input JSON file")
+        # Validate again after fixes; only shots with valid defaults were added,
+        # so just the file coverage can have changed
+        if structure_valid:
+            is_valid, error_message = _validate_coverage(shot_list, all_filenames, shot_filenames)
+        if not is_valid:
+            print(f"Could not fix format issues: {error_message}")
+            print("Proceeding with the generated shot list anyway.")
+    else:
+        print("Shot list format validation successful!")
+    
+    # Check if all files are included
+    print(f"Shot list includes {len(shot_filenames)} out of {len(all_filenames)} video files")
+    
+    # Save to JSON file if requested
+    if output_json_path:
+        try:
+            openai_utils.save_json(shot_list, output_json_path)
+        except OSError as e:
+            print(f"Error saving shot list to {output_json_path}: {e}")
             return None
-        
-        print(f"Found {len(videos_info)} videos with descriptions")
-        
-        # Create a prompt for the AI to generate a shot list
-        videos_text = ""
-        for i, video in enumerate(videos_info):
-            videos_text += f"Video {i+1}: {video['filename']}\n"
-            videos_text += f"Duration: {video['duration']}\n"
-            videos_text += f"Content: {video['content']}\n\n"
-        
-        # Add storyline guidance if provided
-        guidance_text = ""
-        if storyline_guidance:
-            guidance_text = f"\nStoryline Guidance:\n{storyline_guidance}\n\n"
-            print(f"Using provided storyline guidance: {storyline_guidance}")
-        
+        print(f"Shot list saved to {output_json_path}")
+    elif verbose:
+        # If no output path specified, print the shot list
+        print("\nGenerated Shot List:")
+        print(json.dumps(shot_list, indent=2))
+    
+    return shot_list
+
+async def generate_shot_list_from_json(input_json_path, output_json_path=None, storyline_guidance=None, verbose=False):
+    """
+    Generate a shot list narrative in JSON format based on an existing JSON file with video descriptions.
+    
+    Args:
+        input_json_path: Path to the input JSON file with video descriptions
+        output_json_path: Optional path to save the shot list JSON file
+        storyline_guidance: Optional string with creative direction for the storyline
+        verbose: Print the shot list if no output_json_path is given
+    
+    Returns:
+        Dictionary containing the shot list in JSON format
+    """
+    # JSONDecodeError (from json or orjson) is a ValueError
+    try:
+        videos_info, all_filenames = _load_videos_info(input_json_path)
+    except (OSError, ValueError) as e:
+        print(f"Error loading video descriptions: {e}")
+        return None
+    if not videos_info:
+        return None
+    
+    messages = _build_messages(videos_info, storyline_guidance)
+    
+    # Reuse the reply if this exact prompt was already sent
+    cache_key = _cache_key(messages)
+    shot_list_text = openai_utils.read_cache("shot_list", cache_key)
+    if shot_list_text is not None:
+        print("Using cached shot list")
+    else:
         print("Generating shot list...")
         
         # Call Azure OpenAI API to generate shot list
-        response = openai_client.chat.completions.create(
-            model=AZURE_DEPLOYMENT,
-            messages=[
-                {"role": "system", "content": """You are a professional video editor. 
-                Your task is to create a shot list in JSON format that tells a coherent story using the available footage.
-                Analyze the content of each video and suggest an order, timestamps, and transitions that would create a compelling narrative.
-                
-                IMPORTANT: You MUST include EVERY SINGLE video file in your shot list. Do not skip any footage.
-                
-                The output should be valid JSON with the following structure:
-                {
-                  "project_name": "A descriptive name based on the content",
-                  "narrative_theme": "A brief description of the story or theme",
-                  "shots": [
-                    {
-                      "filename": "original_filename.mp4",
-                      "description": "Brief description of this shot's purpose in the narrative",
-                      "start_time": "HH:MM:SS",
-                      "end_time": "HH:MM:SS",
-                      "duration": "HH:MM:SS",
-                      "transition_in": "fade in/dissolve/cut/etc",
-                      "transition_out": "fade out/dissolve/cut/etc"
-                    }
-                  ]
-                }
-                Use realistic timestamps based on the actual duration of each video.
-                Be creative but practical in your suggestions.
-                If the user provides storyline guidance, follow it closely while creating your shot list.
-                
-                Remember: EVERY video file must be included in the shot list."""},
-                {"role": "user", "content": f"""Here are the videos available for editing:{guidance_text}
-                
-                {videos_text}
-                
-                Based on these videos, create a shot list in JSON format that tells a coherent story.
-                The shot list should suggest an order for the footage, with appropriate in/out points and transitions.
-                
-                IMPORTANT: You MUST include ALL {len(videos_info)} video files in your shot list.
-                
-                Return ONLY the JSON with no additional text."""}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
-        
-        # Extract and parse the JSON response
-        shot_list_text = response.choices[0].message.content
-        
-        # Clean up the response to ensure it's valid JSON
-        # Remove any markdown code block indicators and extra text
-        if "```json" in shot_list_text:
-            shot_list_text = shot_list_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in shot_list_text:
-            shot_list_text = shot_list_text.split("```")[1].split("```")[0].strip()
-        
         try:
-            shot_list = json.loads(shot_list_text)
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            print("Raw response:")
-            print(shot_list_text)
+            shot_list_text = await _call_llm(messages)
+        except OpenAIError as e:
+            print(f"Error generating shot list: {e}")
             return None
+        return _process_response(shot_list_text, videos_info, all_filenames, output_json_path, verbose,
+                                 cache_key=cache_key)
+    
+    return _process_response(shot_list_text, videos_info, all_filenames, output_json_path, verbose)
+
+async def generate_shot_lists(inputs, max_concurrency=MAX_CONCURRENCY):
+    """
+    Generate several shot lists concurrently.
+    
+    Args:
+        inputs: List of (input_json_path, output_json_path, storyline_guidance) tuples
+        max_concurrency: Maximum number of requests to the API at the same time
         
-        # Validate the shot list format
-        is_valid, error_message = validate_shot_list_format(shot_list, all_filenames)
-        if not is_valid:
-            print(f"Warning: Generated shot list does not match expected format: {error_message}")
-            print("Attempting to fix the format...")
-            
-            # Try to fix common issues
-            if "shots" not in shot_list:
-                shot_list["shots"] = []
-            
-            if "project_name" not in shot_list:
-                shot_list["project_name"] = "Video Project"
-                
-            if "narrative_theme" not in shot_list:
-                shot_list["narrative_theme"] = "Compilation of available footage"
-            
-            # Check for missing files and add them if needed
-            if all_filenames:
-                shot_filenames = [shot["filename"] for shot in shot_list["shots"]]
-                missing_files = [f for f in all_filenames if f not in shot_filenames]
-                
-                if missing_files:
-                    print(f"Adding missing files to shot list: {', '.join(missing_files)}")
-                    
-                    # Add missing files to the shot list
-                    for filename in missing_files:
-                        # Find the video info for this file
-                        video_info = next((v for v in videos_info if v["filename"] == filename), None)
-                        
-                        if video_info:
-                            # Add a basic shot for this file
-                            shot_list["shots"].append({
-                                "filename": filename,
-                                "description": f"Added shot from {filename}",
-                                "start_time": "00:00:00",
-                                "end_time": video_info.get("duration_formatted", "00:01:00"),
-                                "duration": video_info.get("duration_formatted", "00:01:00"),
-                                "transition_in": "cut",
-                                "transition_out": "cut"
-                            })
-            
-            # Validate again after fixes
-            is_valid, error_message = validate_shot_list_format(shot_list, all_filenames)
-            if not is_valid:
-                print(f"Could not fix format issues: {error_message}")
-                print("Proceeding with the generated shot list anyway.")
-        else:
-            print("Shot list format validation successful!")
-            
-        # Check if all files are included
-        shot_filenames = [shot["filename"] for shot in shot_list["shots"]]
-        print(f"Shot list includes {len(shot_filenames)} out of {len(all_filenames)} video files")
+    Returns:
+        List of shot list dictionaries (None for failures), in the order of inputs
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def generate(args):
+        async with semaphore:
+            return await generate_shot_list_from_json(*args)
+    
+    return await asyncio.gather(*(generate(args) for args in inputs))
+
+async def generate_shot_lists_batch(inputs, poll_interval=60):
+    """
+    Generate many shot lists offline with the Azure OpenAI Batch API.
+    
+    All requests are submitted as one batch job, which is cheaper and not subject to the
+    interactive rate limits, but can take up to 24 hours to complete. A single input is
+    generated directly instead.
+    
+    Args:
+        inputs: List of (input_json_path, output_json_path, storyline_guidance) tuples
+        poll_interval: Seconds to wait between batch status checks
+    
+    Returns:
+        List of shot list dictionaries (None for failures), in the order of inputs
+    """
+    if len(inputs) <= 1:
+        return await generate_shot_lists(inputs)
+    
+    results = [None] * len(inputs)
+    
+    # Build one request line per input
+    jobs = {}
+    lines = []
+    for i, (input_json_path, output_json_path, storyline_guidance) in enumerate(inputs):
+        try:
+            videos_info, all_filenames = _load_videos_info(input_json_path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading {input_json_path}: {e}")
+            continue
+        if not videos_info:
+            continue
         
-        # Save to JSON file if requested
-        if output_json_path:
-            with open(output_json_path, 'w') as f:
-                json.dump(shot_list, f, indent=2)
-            print(f"Shot list saved to {output_json_path}")
-        else:
-            # If no output path specified, print the shot list
-            print("\nGenerated Shot List:")
-            print(json.dumps(shot_list, indent=2))
+        messages = _build_messages(videos_info, storyline_guidance)
+        cache_key = _cache_key(messages)
+        cached = openai_utils.read_cache("shot_list", cache_key)
+        if cached is not None:
+            results[i] = _process_response(cached, videos_info, all_filenames, output_json_path)
+            continue
         
-        return shot_list
+        custom_id = f"shot-list-{i}"
+        jobs[custom_id] = (i, videos_info, all_filenames, output_json_path, cache_key)
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {
+                "model": openai_utils.AZURE_DEPLOYMENT,
+                "messages": messages,
+                "max_tokens": 2000,
+                "temperature": 0.7,
+                "response_format": SHOT_LIST_RESPONSE_FORMAT
+            }
+        }))
     
-    except Exception as e:
-        print(f"Error generating shot list: {e}")
-        return None
+    if not lines:
+        return results
+    
+    batch_file = await openai_utils.get_openai_client().files.create(
+        file=("shot_lists.jsonl", "\n".join(lines).encode()),
+        purpose="batch"
+    )
+    batch = await openai_utils.get_openai_client().batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/chat/completions",
+        completion_window="24h"
+    )
+    print(f"Submitted batch {batch.id} with {len(lines)} shot lists")
+    
+    # Wait for the batch job to finish
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(poll_interval)
+        batch = await openai_utils.get_openai_client().batches.retrieve(batch.id)
+        print(f"Batch {batch.id} status: {batch.status}")
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"Batch {batch.id} did not complete successfully (status: {batch.status})")
+        return results
+    
+    output = await openai_utils.get_openai_client().files.content(batch.output_file_id)
+    for line in output.text.splitlines():
+        if line.strip():
+            # One bad result must not lose the others after waiting for the whole batch
+            try:
+                _process_batch_result(line, jobs, results)
+            except Exception as e:
+                print(f"Error processing batch result: {e}")
+    
+    return results
+
+def _process_batch_result(line, jobs, results):
+    """
+    Process one line of a batch output file and store the shot list in results.
+    """
+    result = json.loads(line)
+    response = result.get("response") or {}
+    job = jobs.get(result.get("custom_id"))
+    if job is None or response.get("status_code") != 200:
+        print(f"Batch request {result.get('custom_id')} failed: {result.get('error')}")
+        return
+    
+    i, videos_info, all_filenames, output_json_path, cache_key = job
+    shot_list_text = response["body"]["choices"][0]["message"]["content"]
+    results[i] = _process_response(shot_list_text, videos_info, all_filenames, output_json_path,
+                                   cache_key=cache_key)
+
+async def _generate_and_close(*args, **kwargs):
+    """
+    Generate one shot list, then close the API client before the event loop shuts down.
+    """
+    try:
+        return await generate_shot_list_from_json(*args, **kwargs)
+    finally:
+        await openai_utils.close_openai_client()
 
 def main():
     parser = argparse.ArgumentParser(description='Generate a shot list from a JSON file with video descriptions')
@@ -305,9 +639,13 @@ def main():
     parser.add_argument('--api-key', help='Azure OpenAI API key (if not set in environment variables)')
     parser.add_argument('--storyline', '-s', help='Creative direction or storyline guidance for the shot list')
     parser.add_argument('--storyline-file', '-sf', help='Path to a text file containing storyline guidance')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the API instead of reusing cached shot lists')
     
     args = parser.parse_args()
     
+    if args.no_cache:
+        openai_utils.use_cache = False
+    
     # Set API key from command line if provided
     if args.api_key:
         os.environ["AZURE_OPENAI_API_KEY"] = args.api_key
@@ -331,10 +669,10 @@ def main():
         try:
             with open(args.storyline_file, 'r') as f:
                 storyline_guidance = f.read().strip()
-        except Exception as e:
+        except OSError as e:
             print(f"Error reading storyline file: {e}")
     
-    generate_shot_list_from_json(args.input_json, output_path, storyline_guidance)
+    asyncio.run(_generate_and_close(args.input_json, output_path, storyline_guidance, verbose=True))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
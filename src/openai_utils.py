@@ -0,0 +1,212 @@
+import os
+import logging
+import json
+import hashlib
+import random
+import tempfile
+import functools
+import asyncio
+import httpx
+import openai
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+
+# orjson is much faster than the standard json module; fall back to json if it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Azure OpenAI configuration
+AZURE_ENDPOINT = "https://ai-coe-openai-models-latest.openai.azure.com/"
+AZURE_MODEL = "gpt-4o-mini"
+AZURE_DEPLOYMENT = "gpt-4o-mini"
+AZURE_API_VERSION = "2024-12-01-preview"
+
+# Maximum number of open connections to the Azure OpenAI endpoint
+MAX_CONNECTIONS = int(os.getenv("AI_EDITOR_MAX_CONN", "512"))
+
+# Client-side cap on API requests per minute, to stay under the deployment quota (0 = no cap)
+MAX_REQUESTS_PER_MINUTE = int(os.getenv("AI_EDITOR_RPM", "0"))
+_next_request_time = 0.0
+
+# Longest wait in seconds between retries of an API call
+MAX_RETRY_DELAY = 60
+
+# Directory where API results are cached across runs
+CACHE_DIR = os.getenv("AI_EDITOR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "ai_editor"))
+
+# Set to False (--no-cache) to always call the API
+use_cache = True
+
+@functools.lru_cache(maxsize=1)
+def get_openai_client():
+    """
+    Create the Azure OpenAI client on first use and reuse it afterwards.
+    
+    The API key is read from AZURE_OPENAI_API_KEY at that point, so it can still be
+    set after import (e.g. by --api-key, followed by close_openai_client).
+    
+    Returns:
+        AsyncAzureOpenAI client sharing one HTTP connection pool
+    """
+    # Shared HTTP connection pool for all Azure OpenAI requests
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=256),
+        timeout=httpx.Timeout(120.0),
+    )
+    
+    # Create OpenAI client using Azure OpenAI with API key authentication
+    # IMPORTANT: For security, it's better to use environment variables than hardcoding the key
+    client = AsyncAzureOpenAI(
+        api_version=AZURE_API_VERSION,
+        azure_endpoint=AZURE_ENDPOINT,
+        api_key=os.getenv("AZURE_OPENAI_API_KEY", ""),
+        http_client=http_client,
+        # Retries are done by call_with_retry; SDK retries on top would multiply the attempts
+        max_retries=0,
+    )
+    logger.info("Initialized Azure OpenAI client with API key authentication")
+    return client
+
+async def close_openai_client():
+    """
+    Close the Azure OpenAI client and its connection pool, if it was created.
+    """
+    if get_openai_client.cache_info().currsize:
+        await get_openai_client().close()
+        get_openai_client.cache_clear()
+
+def load_json(text):
+    """
+    Parse a JSON string or bytes, using orjson when available.
+    """
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def save_json(data, path):
+    """
+    Save data to a JSON file with 2-space indentation, using orjson when available.
+    """
+    if orjson:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+def cache_key(*parts):
+    """
+    Hash the deployment and the given parts (str or bytes) into a cache key, so changing
+    the model or a prompt does not return answers cached for the old one.
+    """
+    hasher = hashlib.blake2b(AZURE_DEPLOYMENT.encode('utf-8'), digest_size=16)
+    for part in parts:
+        hasher.update(b"\0")
+        hasher.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+    return hasher.hexdigest()
+
+def read_cache(namespace, key, memory_cache=None):
+    """
+    Look up a cached API result in memory_cache (if given), then on disk under CACHE_DIR/namespace.
+    
+    Returns:
+        The cached text, or None on a cache miss
+    """
+    if not use_cache:
+        return None
+    
+    if memory_cache is not None and key in memory_cache:
+        return memory_cache[key]
+    
+    try:
+        with open(os.path.join(CACHE_DIR, namespace, f"{key}.txt"), 'r', encoding='utf-8') as f:
+            value = f.read()
+    except OSError:
+        return None
+    
+    if memory_cache is not None:
+        memory_cache[key] = value
+    return value
+
+def write_cache(namespace, key, value, memory_cache=None):
+    """
+    Store an API result in memory_cache (if given) and atomically on disk under CACHE_DIR/namespace.
+    Empty results (e.g. a filtered reply) are not cached.
+    """
+    if not use_cache or value is None:
+        return
+    
+    if memory_cache is not None:
+        memory_cache[key] = value
+    
+    try:
+        cache_dir = os.path.join(CACHE_DIR, namespace)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{key}.txt"))
+    except OSError as e:
+        print(f"Warning: Could not write cache entry: {e}")
+
+async def _throttle():
+    """
+    Space out API requests so no more than MAX_REQUESTS_PER_MINUTE are started.
+    """
+    global _next_request_time
+    if MAX_REQUESTS_PER_MINUTE <= 0:
+        return
+    
+    # Reserve the next free slot before sleeping, so concurrent callers queue up behind each other
+    now = asyncio.get_running_loop().time()
+    slot = max(now, _next_request_time)
+    _next_request_time = slot + 60.0 / MAX_REQUESTS_PER_MINUTE
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+async def call_with_retry(fn, *args, retries=5, base=1.0, **kwargs):
+    """
+    Call an async API function, retrying rate limit (429), server (5xx) and connection errors
+    with exponential backoff and jitter, honoring Retry-After (capped at MAX_RETRY_DELAY).
+    
+    Args:
+        fn: Async function to call
+        retries: Maximum number of attempts
+        base: Base delay in seconds for the backoff
+    
+    Returns:
+        The result of the function call
+    """
+    for attempt in range(retries):
+        await _throttle()
+        try:
+            return await fn(*args, **kwargs)
+        except (openai.RateLimitError, openai.APIStatusError, openai.APIConnectionError, httpx.TimeoutException) as e:
+            status_code = getattr(e, "status_code", None)
+            retryable = isinstance(e, openai.RateLimitError) or status_code is None or status_code >= 500
+            if not retryable or attempt == retries - 1:
+                raise
+            
+            # Honor the Retry-After header when the server provides one
+            delay = base * 2 ** attempt + random.random()
+            response = getattr(e, "response", None)
+            if response is not None:
+                retry_after = response.headers.get("retry-after")
+                if retry_after:
+                    try:
+                        delay = float(retry_after)
+                    except ValueError:
+                        pass
+            
+            # Cap the wait, so a large Retry-After value does not stall the run
+            delay = min(delay, MAX_RETRY_DELAY)
+            
+            print(f"API call failed ({e}), retrying in {delay:.1f}s (attempt {attempt+1}/{retries})...")
+            await asyncio.sleep(delay)